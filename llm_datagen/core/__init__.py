@@ -15,7 +15,7 @@ from .bus import (
     IStandardStream,
     IRecoverableStream
 )
-from .node import INode, INodeContext, IBatchNode, IRecoverableNode
+from .node import INode, INodeContext, IBatchNode, IRecoverableNode, SupportsWriterConfig, SupportsContext, SupportsSeal
 from .pipeline import (
     IPipeline,
     ISequentialPipeline,
@@ -51,6 +51,9 @@ __all__ = [
     "INodeContext",
     "IBatchNode",
     "IRecoverableNode",
+    "SupportsWriterConfig",
+    "SupportsContext",
+    "SupportsSeal",
     
     # Pipeline
     "IPipeline",
@@ -3,9 +3,14 @@ import threading
 import time
 import os
 import json
+import logging
 from typing import Any, Dict, List, Optional, Callable, Protocol
 from abc import ABC
 
+from llm_datagen.util.atomic import atomic_write_text
+
+_hooks_logger = logging.getLogger("DataGen.Hooks")
+
 
 class IPipelineHooks(Protocol):
     """
@@ -15,6 +20,10 @@ class IPipelineHooks(Protocol):
     def clear_state(self) -> None:
         """全新启动时，强制清空内存中的统计数据"""
         ...
+
+    def set_base_dir(self, base_dir: str) -> None:
+        """将持久化目录对齐到 Pipeline 的 results_dir"""
+        ...
     
     # ========== Pipeline 生命周期钩子 ==========
     
@@ -92,6 +101,11 @@ class CompositePipelineHooks(IPipelineHooks):
         for h in self.hooks: 
             if hasattr(h, 'clear_state'): h.clear_state()
 
+    def set_base_dir(self, base_dir: str) -> None:
+        # 递归下发，天然支持嵌套的 Composite
+        for h in self.hooks:
+            if hasattr(h, 'set_base_dir'): h.set_base_dir(base_dir)
+
     def on_pipeline_start(self, context_id: str, config: Dict[str, Any]):
         for h in self.hooks: 
             if hasattr(h, 'on_pipeline_start'): h.on_pipeline_start(context_id, config)
@@ -151,6 +165,10 @@ class CompositePipelineHooks(IPipelineHooks):
                 if cp is not None: return cp
         return None
 
+    def flush(self) -> None:
+        for h in self.hooks:
+            if hasattr(h, 'flush'): h.flush()
+
 
 class PipelineHooksAdapter:
     """适配器：隔离内部实现与回调分发"""
@@ -199,6 +217,9 @@ class DefaultPipelineHooks:
         self._all_nodes = []
         self._lock = threading.Lock()
         self._last_printed_prog = {}
+
+    def set_base_dir(self, base_dir: str) -> None:
+        self.base_dir = base_dir
     
     def on_pipeline_start(self, context_id, config):
         self.start_time = time.time()
@@ -335,17 +356,120 @@ class DefaultPipelineHooks:
         print("=" * 60 + "\n")
 
 
+class _CheckpointCache:
+    """
+    进程内检查点缓存：记录本进程最近写入/读取的检查点文本，以 (mtime_ns, size) 校验新鲜度。
+    同进程内反复恢复时直接命中内存，省去磁盘读取；文件被外部改写后 stat 不匹配，自动回落到磁盘。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}
+
+    def put(self, path: str, text: str) -> None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[path] = (st.st_mtime_ns, st.st_size, text)
+
+    def get(self, path: str) -> Optional[str]:
+        """命中且与磁盘一致时返回文本；文件不存在抛出 FileNotFoundError"""
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        return None
+
+
+_checkpoint_cache = _CheckpointCache()
+
+
+class _CheckpointWriter:
+    """
+    检查点写后合并器：后台线程负责落盘，每个路径只保留最新一份待写快照。
+    新快照会直接覆盖尚未落盘的旧快照（旧状态被新状态完全包含），高频进度回调不再逐次写盘。
+    后台写盘失败会记录日志并保留首个异常，由下一次 flush() 抛给调用方。
+    """
+    _IDLE_TIMEOUT = 5.0 # 空闲多久后退出后台线程，下次提交时再拉起
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: Dict[str, str] = {}
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[OSError] = None
+
+    def submit(self, path: str, text: str) -> None:
+        with self._cond:
+            self._pending[path] = text
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="CheckpointWriter", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        """阻塞直到所有已提交的快照落盘；期间有写盘失败时抛出首个异常"""
+        with self._cond:
+            while self._pending or self._busy:
+                self._cond.wait()
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(timeout=self._IDLE_TIMEOUT)
+                    if not self._pending:
+                        self._thread = None
+                        return
+                batch, self._pending = self._pending, {}
+                self._busy = True
+            try:
+                for path, text in batch.items():
+                    try:
+                        self._write(path, text)
+                    except OSError as e:
+                        _hooks_logger.exception("检查点写盘失败: %s", path)
+                        with self._cond:
+                            if self._error is None:
+                                self._error = e
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _write(path: str, text: str) -> None:
+        # 先写临时文件再原子替换，崩溃时磁盘上始终是一份完整的检查点
+        atomic_write_text(path, text)
+        _checkpoint_cache.put(path, text)
+
+
 class JsonFileCheckpointHooks(DefaultPipelineHooks):
     """磁盘检查点持久化钩子"""
     def __init__(self, base_dir: str = "tmp/results"):
         super().__init__(base_dir=base_dir)
+        self._writer = _CheckpointWriter()
 
     def _save_checkpoint(self, cid):
         path = os.path.join(self.base_dir, cid, "checkpoint.json")
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 在锁内序列化得到一致的快照，落盘交给后台线程合并执行
         with self._lock:
             data = {"nodes": self.node_progress, "updated_at": time.time(), "pipeline_id": cid}
-            with open(path, "w", encoding="utf-8") as f: json.dump(data, f, indent=2, ensure_ascii=False)
+            text = json.dumps(data, indent=2, ensure_ascii=False)
+        self._writer.submit(path, text)
+
+    def flush(self) -> None:
+        """等待所有检查点落盘"""
+        self._writer.flush()
+
+    def on_pipeline_end(self, cid, ok, err=None):
+        self.flush()
+        super().on_pipeline_end(cid, ok, err)
 
     def on_node_start(self, cid, nid, cfg):
         super().on_node_start(cid, nid, cfg)
@@ -364,17 +488,25 @@ class JsonFileCheckpointHooks(DefaultPipelineHooks):
         self._save_checkpoint(cid)
 
     def load_state(self, cid, cfg):
+        self.flush()
         path = os.path.join(self.base_dir, cid, "checkpoint.json")
-        if not os.path.exists(path): return
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            with self._lock: 
-                # 恢复进度
-                self.node_progress = data.get("nodes", {})
-                # 核心修复：将历史节点的 ID 全部注册到统计名单中
-                for nid in self.node_progress.keys():
-                    if nid not in self._all_nodes:
-                        self._all_nodes.append(nid)
+        try:
+            text = _checkpoint_cache.get(path)
+        except FileNotFoundError:
+            return
+        if text is None:
+            # 未命中进程内缓存 (如进程重启后首次恢复)：读取磁盘并回填
+            with open(path, "r", encoding="utf-8") as f: text = f.read()
+            _checkpoint_cache.put(path, text)
+        # 每次都解析出新对象，恢复出的进度可安全地作为可变状态继续使用
+        data = json.loads(text)
+        with self._lock: 
+            # 恢复进度
+            self.node_progress = data.get("nodes", {})
+            # 核心修复：将历史节点的 ID 全部注册到统计名单中
+            for nid in self.node_progress.keys():
+                if nid not in self._all_nodes:
+                    self._all_nodes.append(nid)
         print(f"💾 [Hooks] 从磁盘成功恢复了 {len(self.node_progress)} 个节点的历史位点与身份")
 
     def get_checkpoint(self, nid: str) -> Any:
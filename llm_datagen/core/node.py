@@ -51,3 +51,20 @@ class IRecoverableNode(INode, Protocol):
     """可恢复节点接口"""
     def get_runtime(self) -> Dict[str, Any]: ...
     def resume_from_runtime(self, runtime_data: Dict[str, Any]) -> None: ...
+
+# ========== 可选能力声明 ==========
+
+@runtime_checkable
+class SupportsWriterConfig(Protocol):
+    """可接收 Pipeline 全局写入配置的节点"""
+    def set_writer_config(self, config: Any) -> None: ...
+
+@runtime_checkable
+class SupportsContext(Protocol):
+    """可注入执行上下文的节点"""
+    def set_context(self, ctx: Any) -> None: ...
+
+@runtime_checkable
+class SupportsSeal(Protocol):
+    """可物理补齐结束封条的流"""
+    def seal(self) -> None: ...
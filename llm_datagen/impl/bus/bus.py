@@ -13,11 +13,12 @@ from llm_datagen.core.bus import IReader, IWriter, IRecoverableStream, IDataStre
 from llm_datagen.core.storage import IStorage
 from llm_datagen.core.channel import IChannel
 from llm_datagen.core.config import WriterConfig
-from llm_datagen.impl.storage.jsonl_storage import JsonlStorage
+from llm_datagen.impl.storage.jsonl_storage import JsonlStorage, BufferedJsonlStorage
 from llm_datagen.impl.storage.csv_storage import CsvStorage
 from llm_datagen.impl.storage.memory_storage import MemoryStorage
 from llm_datagen.impl.channel.threading_channel import ThreadingChannel
 from llm_datagen.impl.bus.stream_bridge import StreamBridge
+from llm_datagen.util.atomic import atomic_write_text
 
 _bus_logger = logging.getLogger("DataGen.Bus")
 
@@ -89,6 +90,12 @@ class BaseStream(IRecoverableStream, ABC):
     def open(self): self._is_opened = True
     def close(self): self._is_opened = False
 
+    def flush(self):
+        """将存储层尚未落盘的缓冲写出（存储支持组提交时生效）"""
+        storage = getattr(self, '_storage', None)
+        if storage is not None and hasattr(storage, 'flush_batch'):
+            storage.flush_batch()
+
     def clear_data(self):
         """默认实现：重置状态。子类可重写以执行物理删除。"""
         if self._last_reader and hasattr(self._last_reader, 'resume'):
@@ -114,10 +121,7 @@ class BaseStream(IRecoverableStream, ABC):
         }
 
     def save_runtime(self, file_path: str) -> None:
-        state = self.get_runtime()
-        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(state, f, indent=2, ensure_ascii=False)
+        atomic_write_text(file_path, json.dumps(self.get_runtime(), indent=2, ensure_ascii=False))
 
     def resume_from_runtime(self, runtime_data: Dict[str, Any]) -> None:
         if "uri" in runtime_data:
@@ -154,9 +158,14 @@ class FileStream(BaseStream, ABC):
     def clear_data(self):
         """物理删除文件及封条"""
         super().clear_data()
-        if os.path.exists(self.path):
-            os.remove(self.path)
-        self.unseal()
+        # 由存储负责删除数据文件与封条，同时释放常驻句柄并复位计数/索引缓存
+        storage = getattr(self, '_storage', None)
+        if storage is not None:
+            storage.clear()
+            return
+        for path in (self.path, f"{self.path}.done"):
+            try: os.remove(path)
+            except FileNotFoundError: pass
 
     def unseal(self):
         """物理撕掉封条"""
@@ -176,12 +185,14 @@ class FileStream(BaseStream, ABC):
 class JsonlStream(FileStream):
     PROTOCOL = "jsonl"
     SUFFIX = ".jsonl"
-    def __init__(self): 
+    def __init__(self, buffered: bool = False): 
         super().__init__()
+        # buffered=True 时启用组提交存储：小批次合并写出，以毫秒级可见延迟换取更少的写系统调用
+        self.buffered = buffered
         self._storage = None; self._channel = ThreadingChannel()
     def create(self, uri: str, protocol_prefix: str = "", base_path: str = ""):
         super().create(uri, protocol_prefix, base_path)
-        self._storage = JsonlStorage(self.path)
+        self._storage = BufferedJsonlStorage(self.path) if self.buffered else JsonlStorage(self.path)
         return self
     def get_reader(self, progress=None): 
         reader = GenericReader(self._storage, self._channel, progress or 0)
@@ -253,6 +264,9 @@ class UnifiedFileStream(FileStream):
         return self._impl.get_writer(options)
     def clear_data(self):
         if self._impl: self._impl.clear_data()
+
+    def flush(self):
+        if self._impl: self._impl.flush()
     
     def unseal(self):
         if self._impl: self._impl.unseal()
@@ -431,6 +445,15 @@ class StreamFactory:
             return MemoryStream().create(uri, protocol_prefix, base_path)
         return UnifiedFileStream().create(uri, protocol_prefix, base_path)
 
+    @staticmethod
+    def clear_many(streams) -> None:
+        """批量清理：按对象去重（池化流常被多个节点共享），每个流只清理一次"""
+        seen = set()
+        for stream in streams:
+            if stream is None or id(stream) in seen: continue
+            seen.add(id(stream))
+            stream.clear_data()
+
 class RecoverableStreamFactory(StreamFactory):
     def __init__(self):
         self._pool = {} # 流对象池
@@ -4,8 +4,9 @@ import threading
 import time
 import logging
 import os
+from contextlib import nullcontext
 from typing import Any, List, Optional, Dict, Callable
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from llm_datagen.core.node import INode, IBatchNode, IRecoverableNode, NodeStatus
 from llm_datagen.core.operators import IOperator, BaseOperator
@@ -136,7 +137,7 @@ class BaseNode(IRecoverableNode):
 
     def open(self, ctx: Optional[NodeContextImpl] = None, progress: Optional[Any] = None):
         if ctx: self.set_context(ctx)
-        _node_logger.info(f"{self.log_id} 🎬 节点开启 (Status={self._status.value})")
+        _node_logger.info("%s 🎬 节点开启 (Status=%s)", self.log_id, self._status.value)
         
         # 核心修复：尊重恢复状态，不要盲目覆盖为 RUNNING
         if self._status != NodeStatus.COMPLETED:
@@ -162,7 +163,7 @@ class BaseNode(IRecoverableNode):
             # 核心改进：初始总量对齐物理存储，但进度保持由快照注入的真相位点
             self._total_progress = self._reader.total_count
             
-            _node_logger.info(f"{self.log_id} 📊 物理位点对齐: 进度={self._current_progress}, 总量={self._total_progress}")
+            _node_logger.info("%s 📊 物理位点对齐: 进度=%s, 总量=%s", self.log_id, self._current_progress, self._total_progress)
             
             # 核心改进：开启时立即上报一次初始位点（确保 total 被 Hook 捕获）
             if self._ctx:
@@ -185,7 +186,7 @@ class BaseNode(IRecoverableNode):
                 self._total_progress = self._current_progress
             self._ctx.report_progress(self._current_progress, self._total_progress)
         
-        _node_logger.info(f"{self.log_id} 🏁 节点关闭 (Status: {old_status.value} -> {self._status.value}, Duration: {self.get_duration():.2f}s)")
+        _node_logger.info("%s 🏁 节点关闭 (Status: %s -> %s, Duration: %.2fs)", self.log_id, old_status.value, self._status.value, self.get_duration())
 
     def cancel(self):
         if self._status == NodeStatus.RUNNING:
@@ -291,7 +292,7 @@ class BatchNode(BaseNode, IBatchNode):
         reader = getattr(self, '_reader', None)
         writer = getattr(self, '_writer', None)
         if not reader:
-            _node_logger.warning(f"{self.log_id} ⚠️ 引擎未就绪 (无 Reader)，跳过执行")
+            _node_logger.warning("%s ⚠️ 引擎未就绪 (无 Reader)，跳过执行", self.log_id)
             return
 
         # 核心修复：同步总量（流式模式下总量会随上游写入而增长）
@@ -320,19 +321,19 @@ class BatchNode(BaseNode, IBatchNode):
 
                 # 丰富日志格式
                 idx_range = f"{ids[0]}~{ids[-1]}" if len(ids) > 1 else f"{ids[0]}"
-                _node_logger.info(f"{self.log_id} 📥 读取批次: 数量={len(data)}, 索引={idx_range}")
+                _node_logger.info("%s 📥 读取批次: 数量=%d, 索引=%s", self.log_id, len(data), idx_range)
                 
                 processed = self.process_batch(data)
                 if writer and processed:
                     writer.write(processed, anchors=ids)
-                    _node_logger.info(f"{self.log_id} 📤 写入完成: 成功={len(processed)}条")
+                    _node_logger.info("%s 📤 写入完成: 成功=%d条", self.log_id, len(processed))
             
             if self._ctx: self._ctx.report_progress(self._total_progress, self._total_progress)
             
         except InterruptedError:
             self.cancel(); raise
         except Exception as e:
-            _node_logger.error(f"{self.log_id} 🚨 运行崩溃: {e}", exc_info=True)
+            _node_logger.error("%s 🚨 运行崩溃: %s", self.log_id, e, exc_info=True)
             self._status = NodeStatus.FAILED; raise
         finally:
             self.close()
@@ -355,6 +356,11 @@ class ParallelBatchNode(BatchNode):
         super().__init__(node_id=node_id, input_uri=input_uri, output_uri=output_uri, 
                          protocol_prefix=protocol_prefix, base_path=base_path, batch_size=batch_size)
         self._parallel_size = parallel_size
+        self._executor: Optional[ThreadPoolExecutor] = None # 外部注入的共享线程池 (可选)
+
+    def set_executor(self, executor: Optional[ThreadPoolExecutor]):
+        """注入共享线程池；并发上限仍由本节点的信号量按 parallel_size 控制"""
+        self._executor = executor
 
     def run(self):
         # 核心修复：只要不是完成或取消，都可以尝试运行 (包含 RESUMING, FAILED)
@@ -365,7 +371,7 @@ class ParallelBatchNode(BatchNode):
         reader = getattr(self, '_reader', None)
         writer = getattr(self, '_writer', None)
         if not reader:
-            _node_logger.warning(f"{self.log_id} ⚠️ 引擎未就绪 (无 Reader)，跳过执行")
+            _node_logger.warning("%s ⚠️ 引擎未就绪 (无 Reader)，跳过执行", self.log_id)
             return
 
         # 核心修复：只同步总量
@@ -379,7 +385,9 @@ class ParallelBatchNode(BatchNode):
         batch_counter = 0
 
         try:
-            with ThreadPoolExecutor(max_workers=self._parallel_size) as executor:
+            # 有共享线程池时直接复用 (不在此处关闭)，否则按原方式创建私有线程池
+            shared = self._executor
+            with (nullcontext(shared) if shared is not None else ThreadPoolExecutor(max_workers=self._parallel_size)) as executor:
                 for data, ids in reader.read(batch_size=self._batch_size):
                     self._check_cancelled()
                     batch_counter += 1
@@ -402,16 +410,16 @@ class ParallelBatchNode(BatchNode):
 
                     # 丰富日志格式
                     idx_range = f"{ids[0]}~{ids[-1]}" if len(ids) > 1 else f"{ids[0]}"
-                    _node_logger.info(f"{self.log_id} 📥 读取批次(并行): 数量={len(data)}, 索引={idx_range}")
+                    _node_logger.info("%s 📥 读取批次(并行): 数量=%d, 索引=%s", self.log_id, len(data), idx_range)
                     
                     def _safe_task(d, i):
                         try:
                             res = self.process_batch(d)
                             if writer and res:
                                 writer.write(res, anchors=i)
-                                _node_logger.info(f"{self.log_id} ✅ 并行批次完成: {len(res)} 条")
+                                _node_logger.info("%s ✅ 并行批次完成: %d 条", self.log_id, len(res))
                         except Exception as e:
-                            _node_logger.error(f"{self.log_id} ❌ 并行处理失败: {e}", exc_info=True)
+                            _node_logger.error("%s ❌ 并行处理失败: %s", self.log_id, e, exc_info=True)
                             raise
                         finally:
                             # 任务结束，释放信号量
@@ -438,6 +446,9 @@ class ParallelBatchNode(BatchNode):
         except Exception as e:
             self._status = NodeStatus.FAILED; raise
         finally:
+            # 共享线程池不会随 with 退出而等待：异常 / 取消时也要等在途任务写完，再关闭写入器封条
+            if futures:
+                wait(futures)
             self.close()
 
     def _get_config_data(self) -> Dict[str, Any]:
@@ -513,8 +524,18 @@ class UnifiedNode(BaseNode):
         self._batch_size = batch_size
         self._parallel_size = parallel_size
         self._processor = None
+        self._executor: Optional[ThreadPoolExecutor] = None
         self._impl: Optional[BatchNode] = None
 
+    @property
+    def parallel_size(self) -> int: return self._parallel_size
+
+    def set_executor(self, executor: Optional[ThreadPoolExecutor]):
+        """为并行引擎注入共享线程池，并同步给内部引擎"""
+        self._executor = executor
+        if self._impl and hasattr(self._impl, 'set_executor'):
+            self._impl.set_executor(executor)
+
     def set_processor(self, func):
         """设置业务处理函数，并同步给内部引擎"""
         self._processor = func
@@ -565,6 +586,7 @@ class UnifiedNode(BaseNode):
 
         if self._ctx: self._impl.set_context(self._ctx)
         if self._input_stream: self._impl.bind_io(self._input_stream, self._output_stream)
+        if self._executor is not None and hasattr(self._impl, 'set_executor'): self._impl.set_executor(self._executor)
 
     @property
     def status(self) -> NodeStatus: return self._impl.status if self._impl else self._status
@@ -688,6 +710,7 @@ class UnifiedOperatorNode(UnifiedNode):
 
         if self._ctx: self._impl.set_context(self._ctx)
         if self._input_stream: self._impl.bind_io(self._input_stream, self._output_stream)
+        if self._executor is not None and hasattr(self._impl, 'set_executor'): self._impl.set_executor(self._executor)
 
     def get_runtime(self) -> Dict[str, Any]:
         rt = super().get_runtime()
@@ -713,7 +736,7 @@ class InputNode(UnifiedNode):
         if self._impl and hasattr(self._impl, "_reader") and self._impl._reader:
             if hasattr(self._impl._reader, "channel"):
                 self._impl._reader.channel.set_eof()
-                _node_logger.info(f"{self.log_id} 已将输入源标记为静态 (EOF)")
+                _node_logger.info("%s 已将输入源标记为静态 (EOF)", self.log_id)
 
 class OutputNode(UnifiedNode):
     def __init__(self, 
@@ -6,9 +6,12 @@ import signal
 import time
 import os
 import logging
+import functools
+import queue
+import weakref
 from abc import ABC, abstractmethod 
 from typing import Any, List, Dict, Optional, Callable
-from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # ------------------- 平台级 Logger 配置 -------------------
 _platform_logger = logging.getLogger("DataGen.Platform")
@@ -32,7 +35,7 @@ from llm_datagen.core.pipeline import (
     PipelineStatus
 )
 from llm_datagen.core.config import NodeConfig, WriterConfig
-from llm_datagen.core.node import INode, IRecoverableNode, NodeStatus
+from llm_datagen.core.node import INode, IRecoverableNode, NodeStatus, SupportsWriterConfig, SupportsContext, SupportsSeal
 from llm_datagen.core.operators import BaseOperator
 from llm_datagen.core.hooks import (
     IPipelineHooks,
@@ -40,8 +43,57 @@ from llm_datagen.core.hooks import (
     PipelineHooksAdapter
 )
 from llm_datagen.impl.node import NodeContextImpl, UnifiedNode, UnifiedOperatorNode, InputNode, OutputNode
+from llm_datagen.util.atomic import atomic_write_text
 from llm_datagen.impl.bus.bus import RecoverableStreamFactory, StreamFactory, get_protocol_extension
 
+# 节点能力位：注册节点时一次性探测，运行期按位判断，避免反复的 hasattr / Protocol isinstance
+_CAP_WRITER_CFG = 1
+_CAP_CONTEXT = 2
+_CAP_SEAL = 4 # 输出流支持 seal()
+_CAP_RECOVERABLE = 8
+
+
+def _node_caps(node: INode) -> int:
+    caps = 0
+    if isinstance(node, SupportsWriterConfig): caps |= _CAP_WRITER_CFG
+    if isinstance(node, SupportsContext): caps |= _CAP_CONTEXT
+    if isinstance(getattr(node, 'output_stream', None), SupportsSeal): caps |= _CAP_SEAL
+    if isinstance(node, IRecoverableNode): caps |= _CAP_RECOVERABLE
+    return caps
+
+
+# ------------------- 进程级信号处理 -------------------
+# 处理器每个进程只安装一次，收到信号时取消所有运行中的 Pipeline，并把信号转交给宿主应用原有的处理器
+_active_pipelines: "weakref.WeakSet" = weakref.WeakSet()
+_previous_handlers: Dict[int, Any] = {}
+_signal_lock = threading.Lock()
+_signal_handlers_installed = False
+
+
+def _dispatch_signal(sig, frame):
+    for pipeline in list(_active_pipelines):
+        pipeline.cancel()
+    prev = _previous_handlers.get(sig)
+    # 默认的 KeyboardInterrupt 处理器不转交，保持“优雅取消”语义；SIG_DFL / SIG_IGN 不可调用
+    if callable(prev) and prev is not signal.default_int_handler:
+        prev(sig, frame)
+
+
+def _install_signal_handlers() -> None:
+    global _signal_handlers_installed
+    if _signal_handlers_installed or threading.current_thread() is not threading.main_thread():
+        return
+    with _signal_lock:
+        if _signal_handlers_installed: return
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                _previous_handlers[sig] = signal.getsignal(sig)
+                signal.signal(sig, _dispatch_signal)
+            except (ValueError, OSError):
+                pass
+        _signal_handlers_installed = True
+
+
 class PipelineContextImpl:
     """Pipeline 执行上下文：管理全局信号"""
     def __init__(self, is_cancelled_func: Callable[[], bool]):
@@ -59,17 +111,30 @@ class BasePipeline(IRecoverablePipeline, ABC):
     承担标识、状态、结果目录及基础生命周期管理。
     """
     LOG_TAG = "Pipeline"
+    # 仅剩单个可运行节点时是否在调用线程内直接执行 (跳过线程池派发)
+    _inline_single_node = True
 
     def __init__(self, hooks: Optional[IPipelineHooks] = None, results_dir: str = "tmp/results", writer_config: Optional[WriterConfig] = None):
         self.results_dir = results_dir
+        self._writer_config_dict: Optional[Dict[str, Any]] = None
         self.writer_config = writer_config or WriterConfig()
         self._hooks = self._init_hooks(hooks)
         self._hooks_adapter = PipelineHooksAdapter(self._hooks)
+        # Hooks 的可选能力在构造时探测一次
+        self._hooks_has_usages = hasattr(self._hooks, 'node_usages')
+        self._hooks_has_load_state_data = hasattr(self._hooks, 'load_state_data')
+        self._hooks_has_load_state = hasattr(self._hooks, 'load_state')
+        self._hooks_has_get_checkpoint = hasattr(self._hooks, 'get_checkpoint')
         
         self._pipeline_id = None
         self._status = PipelineStatus.PENDING.value
         self._nodes: List[INode] = []
+        self._cancellable_nodes: List[INode] = []
+        self._node_caps: Dict[str, int] = {}
+        self._node_ctx_by_id: Dict[str, Any] = {}
         self._ctx: Optional[PipelineContextImpl] = None
+        # 轮询用的取消标记：普通属性读取是原子的，比 Event.is_set() 更轻；Event 仅保留给需要 wait() 的场景
+        self._cancelled = False
         self._shutdown_event = threading.Event()
         self._start_time = 0
         self._end_time = 0
@@ -81,11 +146,8 @@ class BasePipeline(IRecoverablePipeline, ABC):
         def is_persistence(h): return isinstance(h, JsonFileCheckpointHooks)
         
         if hooks:
-            # 确保传入的自定义 Hooks 也指向同一个 results_dir
-            if hasattr(hooks, 'base_dir'): hooks.base_dir = self.results_dir
-            elif hasattr(hooks, 'hooks'):
-                for h in hooks.hooks:
-                    if hasattr(h, 'base_dir'): h.base_dir = self.results_dir
+            # 确保传入的自定义 Hooks 也指向同一个 results_dir (Composite 会递归下发)
+            if hasattr(hooks, 'set_base_dir'): hooks.set_base_dir(self.results_dir)
 
             has_p = is_persistence(hooks) or (hasattr(hooks, 'hooks') and any(is_persistence(h) for h in hooks.hooks))
             if has_p:
@@ -98,11 +160,23 @@ class BasePipeline(IRecoverablePipeline, ABC):
     def nodes(self) -> List[INode]: return self._nodes
 
     @nodes.setter
-    def nodes(self, value: List[INode]): self._nodes = value
+    def nodes(self, value: List[INode]):
+        self._nodes = value
+        # 注册时一次性筛出支持取消的节点，cancel() 时无需再逐个探测
+        self._cancellable_nodes = [n for n in value if hasattr(n, 'cancel')] if value else []
+        self._node_caps = {n.node_id: _node_caps(n) for n in value} if value else {}
 
     @property
     def pipeline_id(self) -> str: return self._pipeline_id
 
+    @property
+    def writer_config(self) -> WriterConfig: return self._writer_config
+
+    @writer_config.setter
+    def writer_config(self, value: WriterConfig):
+        self._writer_config = value
+        self._writer_config_dict = None # 配置替换后，作废序列化缓存
+
     @property
     def status(self) -> str: return self._status
 
@@ -113,20 +187,28 @@ class BasePipeline(IRecoverablePipeline, ABC):
         if self._start_time == 0: return 0
         return (self._end_time or time.time()) - self._start_time
 
+    def shutdown(self, wait: bool = True):
+        """释放常驻资源（基类没有常驻资源；Pipeline 的持有方不再使用时调用）"""
+
     def cancel(self):
         if self._status == PipelineStatus.CANCELING.value or self._status == PipelineStatus.CANCELED.value:
             return
             
         self._status = PipelineStatus.CANCELING.value
-        _platform_logger.warning(f"🛑 Pipeline 进入取消中状态: {self.pipeline_id}")
+        _platform_logger.warning("🛑 Pipeline 进入取消中状态: %s", self.pipeline_id)
+        self._cancelled = True
         self._shutdown_event.set()
-        for node in self._nodes:
-            if hasattr(node, 'cancel'): node.cancel()
+        for node in self._cancellable_nodes:
+            node.cancel()
 
     def save_checkpoint(self, node: Optional[INode] = None):
         """保存进度、状态以及消耗：委托给 HooksAdapter"""
         if node:
-            if isinstance(node, IRecoverableNode):
+            if self._node_caps.get(node.node_id, 0) & _CAP_RECOVERABLE:
+                # 存盘前先冲刷节点输出流的组提交缓冲，保证检查点记录的进度都已物理落盘
+                stream = getattr(node, 'output_stream', None)
+                if stream is not None and hasattr(stream, 'flush'):
+                    stream.flush()
                 cp = node.get_progress()
                 if cp is not None:
                     # 1. 判定物理状态
@@ -136,10 +218,10 @@ class BasePipeline(IRecoverablePipeline, ABC):
                     
                     # 2. 提取当前已发生的 Token 消耗
                     usage = {}
-                    if hasattr(self._hooks, 'node_usages'):
+                    if self._hooks_has_usages:
                         usage = self._hooks.node_usages.get(node.node_id, {})
                     
-                    # 3. 写入全量检查点
+                    # 3. 写入全量检查点 (每次新建字典，Hooks 可放心持有)
                     self._hooks_adapter.on_checkpoint(self.pipeline_id, node.node_id, {
                         "current": cp.get("current", 0) if isinstance(cp, dict) else cp,
                         "total": cp.get("total", 0) if isinstance(cp, dict) else 0,
@@ -152,24 +234,48 @@ class BasePipeline(IRecoverablePipeline, ABC):
 
     def get_runtime(self) -> Dict[str, Any]:
         """获取运行时身份快照（最简基础数据）"""
-        return {
-            "pipeline_id": self.pipeline_id,
-            "status": self.status,
-            "duration": self.get_duration(),
-            "config": self.config,
-            "writer_config": self.writer_config.to_dict()
-        }
+        if self._writer_config_dict is None:
+            self._writer_config_dict = self.writer_config.to_dict()
+        return type(self)._runtime_builder()(self)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _runtime_builder(cls) -> Callable[["BasePipeline"], Dict[str, Any]]:
+        """按类特化一次快照构造函数：未覆写 status/pipeline_id 的类直接读字段，跳过 property 调用链"""
+        direct = (
+            cls.status is BasePipeline.status
+            and cls.pipeline_id is BasePipeline.pipeline_id
+        )
+        if direct:
+            def _build(self):
+                return {
+                    "pipeline_id": self._pipeline_id,
+                    "status": self._status,
+                    # 时长统一走 get_duration，避免与其计算口径分叉
+                    "duration": self.get_duration(),
+                    "config": self.config,
+                    "writer_config": self._writer_config_dict
+                }
+        else:
+            def _build(self):
+                return {
+                    "pipeline_id": self.pipeline_id,
+                    "status": self.status,
+                    "duration": self.get_duration(),
+                    "config": self.config,
+                    "writer_config": self._writer_config_dict
+                }
+        return _build
 
     def save_runtime(self, file_path: Optional[str] = None):
         """保存运行时蓝图到磁盘"""
         import json
         path = file_path or os.path.join(self.results_dir, self.pipeline_id, "runtime.json")
-        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(self.get_runtime(), f, indent=2, ensure_ascii=False)
+        # 一次性序列化后单次写入并原子替换，避免 json.dump 的分段写入与崩溃时的半截文件
+        atomic_write_text(path, json.dumps(self.get_runtime(), indent=2, ensure_ascii=False))
         
         tag = getattr(self, "LOG_TAG", "Pipeline")
-        _platform_logger.info(f"💾 [{tag}] 运行时蓝图已保存: {path}")
+        _platform_logger.info("💾 [%s] 运行时蓝图已保存: %s", tag, path)
 
     @abstractmethod
     def resume_from_runtime(self, runtime_data: Dict[str, Any]):
@@ -213,39 +319,40 @@ class NodePipeline(BasePipeline):
         if self._status != PipelineStatus.RESUMING.value:
             self._status = PipelineStatus.RUNNING.value
             
-        _platform_logger.info(f"🚀 [Engine] Pipeline 启动: {self.pipeline_id} (Mode={'Resume' if self._status == PipelineStatus.RESUMING.value else 'New'})")
+        mode = 'Resume' if self._status == PipelineStatus.RESUMING.value else 'New'
+        _platform_logger.info("🚀 [Engine] Pipeline 启动: %s (Mode=%s)", self.pipeline_id, mode)
         
         self._setup_signal_handlers()
         
         if not self._ctx:
-            self._ctx = PipelineContextImpl(lambda: self._shutdown_event.is_set())
+            self._ctx = PipelineContextImpl(lambda: self._cancelled)
 
         self._hooks_adapter.on_pipeline_start(self.pipeline_id, self.config)
         
-        # 为每个物理节点注入 Context
+        # 为每个物理节点注入 Context (每个 Pipeline 实例每个节点仅构造一次，后续 open(ctx=...) 复用同一对象)
+        self._node_ctx_by_id = {}
         for node in self._nodes:
+            caps = self._node_caps.get(node.node_id, 0)
             # 注入全局写入配置
-            if hasattr(node, "set_writer_config"):
+            if caps & _CAP_WRITER_CFG:
                 node.set_writer_config(self.writer_config)
             
-            node_ctx = self._create_node_context(node)
-            if hasattr(node, "set_context"): 
+            node_ctx = self._node_ctx_by_id[node.node_id] = self._create_node_context(node)
+            if caps & _CAP_CONTEXT: 
                 node.set_context(node_ctx)
 
     def _setup_signal_handlers(self):
-        def handler(sig, frame): self.cancel()
-        if threading.current_thread() is threading.main_thread():
-            try: 
-                signal.signal(signal.SIGINT, handler)
-                signal.signal(signal.SIGTERM, handler)
-            except: pass
+        """登记为活跃 Pipeline；进程级处理器仅首次安装 (且只能在主线程安装)"""
+        _active_pipelines.add(self)
+        _install_signal_handlers()
 
     def close(self, success: bool, error: Exception = None):
+        _active_pipelines.discard(self)
         self._end_time = time.time()
         self._status = PipelineStatus.COMPLETED.value if success else PipelineStatus.FAILED.value
         
-        status_str = "SUCCESS" if success else f"FAILED ({error})"
-        _platform_logger.info(f"🏁 [Engine] Pipeline 结束: {self.pipeline_id} | Status: {status_str} | Duration: {self.get_duration():.2f}s")
+        status_str = "SUCCESS" if success else "FAILED (%s)" % (error,)
+        _platform_logger.info("🏁 [Engine] Pipeline 结束: %s | Status: %s | Duration: %.2fs", self.pipeline_id, status_str, self.get_duration())
         
         self._hooks_adapter.on_pipeline_end(self.pipeline_id, success, error)
 
@@ -260,22 +367,23 @@ class NodePipeline(BasePipeline):
             self.writer_config = WriterConfig(**runtime_data["writer_config"])
             
         # 1. 恢复 Hooks 业务状态 (如有)
-        if "hook_state" in runtime_data and runtime_data["hook_state"] and hasattr(self._hooks, "load_state_data"):
+        if "hook_state" in runtime_data and runtime_data["hook_state"] and self._hooks_has_load_state_data:
             self._hooks.load_state_data(runtime_data["hook_state"])
             
         # 2. 核心：加载磁盘持久化位点 (这是最实时的真理来源)
-        if hasattr(self._hooks, "load_state"): 
+        if self._hooks_has_load_state: 
             self._hooks.load_state(self.pipeline_id, self.config)
 
-        # 3. 遍历当前物理节点并注入恢复状态
+        # 3. 遍历当前物理节点并注入恢复状态 (先按 node_id 建索引，避免逐节点线性查找)
+        rt_by_id = {n.get("node_id"): n for n in runtime_data.get("nodes", ())}
         for node in self._nodes:
             # 获取该节点的实时检查点 (这是磁盘上最新的真相)
             cp = None
-            if hasattr(self._hooks, 'get_checkpoint'):
+            if self._hooks_has_get_checkpoint:
                 cp = self._hooks.get_checkpoint(node.node_id)
             
             # 准备节点的恢复快照
-            node_rt = next((n for n in runtime_data.get("nodes", []) if n.get("node_id") == node.node_id), {})
+            node_rt = rt_by_id.get(node.node_id, {})
             
             # 融合 Checkpoint：如果磁盘有更新的进度，覆盖快照中的旧值
             if cp and isinstance(cp, dict):
@@ -300,71 +408,105 @@ class NodePipeline(BasePipeline):
             
             # 核心改进：对于已完成的节点，确保其物理封条存在，防止下游阻塞
             if node.status == NodeStatus.COMPLETED:
-                if hasattr(node, "output_stream") and node.output_stream:
-                    if hasattr(node.output_stream, "seal"):
-                        node.output_stream.seal()
+                if self._node_caps.get(node.node_id, 0) & _CAP_SEAL:
+                    node.output_stream.seal()
             
-            _platform_logger.info(f"🧬 [Engine] 已为节点 {node.node_id} 注入恢复位点: {cp}")
+            _platform_logger.info("🧬 [Engine] 已为节点 %s 注入恢复位点: %s", node.node_id, cp)
             
         return self
 
     def _create_node_context(self, node: INode):
-        pipeline_id = self.pipeline_id
-        
-        def _on_usage(m):
-            # 自动嗅探格式并转发，确保 Token 统计正确
-            provider = m.get("provider", "unknown")
-            model = m.get("model", "unknown")
-            # 过滤掉非数值字段，只传递真正的 metrics 指标
-            numeric_metrics = {k: v for k, v in m.items() if isinstance(v, (int, float)) and k not in ["provider", "model"]}
-            self._hooks_adapter.on_usage(pipeline_id, node.node_id, provider, model, numeric_metrics)
-
+        callbacks = _NodeCallbacks(self, node)
         return NodeContextImpl(
             node_id=node.node_id, 
-            context_id=pipeline_id, 
-            on_progress=lambda curr, total, meta, nid=node.node_id: self._hooks_adapter.on_node_progress(pipeline_id, nid, curr, total, meta),
-            on_usage=_on_usage,
-            on_log=lambda msg, lv, nid=node.node_id: self._hooks_adapter.on_node_log(pipeline_id, nid, msg, lv),
-            on_error=lambda e, items, nid=node.node_id: self._hooks_adapter.on_node_error(pipeline_id, nid, e, items),
+            context_id=callbacks.pipeline_id, 
+            on_progress=callbacks.on_progress,
+            on_usage=callbacks.on_usage,
+            on_log=callbacks.on_log,
+            on_error=callbacks.on_error,
             is_cancelled_func=self._ctx.is_cancelled,
             # 核心改进：允许 Node 主动触发 Pipeline 存盘
-            save_checkpoint_func=lambda nid=node.node_id: self.save_checkpoint(node)
+            save_checkpoint_func=callbacks.save_checkpoint
         )
 
 
+_USAGE_EXCLUDE = frozenset(("provider", "model"))
+_NUMERIC_TYPES = (int, float, bool)
+
+
+def _filter_numeric(m: Dict[str, Any], _ex=_USAGE_EXCLUDE, _t=_NUMERIC_TYPES) -> Dict[str, Any]:
+    """提取数值型指标：精确类型命中走 type() 快路径，数值子类再回落到 isinstance"""
+    return {k: v for k, v in m.items() if (type(v) in _t or isinstance(v, _t)) and k not in _ex}
+
+
+class _NodeCallbacks:
+    """
+    单个节点的回调集合：以绑定方法取代逐节点构造的一组 lambda，
+    并在构造时预先绑定 HooksAdapter 的分发方法，回调时省去逐级属性查找。
+    """
+    __slots__ = ("pipeline", "node", "pipeline_id", "node_id", "_progress", "_usage", "_log", "_error")
+
+    def __init__(self, pipeline: NodePipeline, node: INode):
+        adapter = pipeline._hooks_adapter
+        self.pipeline = pipeline
+        self.node = node
+        self.pipeline_id = pipeline.pipeline_id
+        self.node_id = node.node_id
+        self._progress = adapter.on_node_progress
+        self._usage = adapter.on_usage
+        self._log = adapter.on_node_log
+        self._error = adapter.on_node_error
+
+    def on_progress(self, curr, total, meta): self._progress(self.pipeline_id, self.node_id, curr, total, meta)
+    def on_log(self, msg, lv): self._log(self.pipeline_id, self.node_id, msg, lv)
+    def on_error(self, e, items): self._error(self.pipeline_id, self.node_id, e, items)
+    def save_checkpoint(self): self.pipeline.save_checkpoint(self.node)
+
+    def on_usage(self, m):
+        # 自动嗅探格式并转发，确保 Token 统计正确
+        provider = m.get("provider", "unknown")
+        model = m.get("model", "unknown")
+        # 过滤掉非数值字段，只传递真正的 metrics 指标
+        self._usage(self.pipeline_id, self.node_id, provider, model, _filter_numeric(m))
+
+
 class SequentialPipeline(NodePipeline, ISequentialPipeline):
     """顺序执行引擎：逐个运行节点"""
     def run(self):
+        self._cancelled = False
         self._shutdown_event.clear()
         self.open()
         
-        _platform_logger.info(f"🚀 [Sequential] Pipeline 启动: {self.pipeline_id}")
+        _platform_logger.info("🚀 [Sequential] Pipeline 启动: %s", self.pipeline_id)
         
         success = True; error = None
         try:
             for node in self.nodes:
-                if self._shutdown_event.is_set(): break
+                if self._cancelled: break
                 
                 # 核心改进：跳过已完成的节点 (恢复模式的关键)
                 if node.status == NodeStatus.COMPLETED:
-                    _platform_logger.info(f"⏭️  节点 {node.node_id} 已在历史记录中完成，跳过")
+                    _platform_logger.info("⏭️  节点 %s 已在历史记录中完成，跳过", node.node_id)
                     continue
 
                 print(f"\n🎬 正在运行节点: {node.node_id}")
                 try:
                     self._hooks_adapter.on_node_start(self.pipeline_id, node.node_id, {})
-                    node.run()
-                    # 运行成功，立即显式更新并保存检查点
+                    try:
+                        node.run()
+                    except Exception as e:
+                        # 运行失败：先携带最终状态存盘，再通知 Hooks (on_node_error 负责落盘 checkpoint.json)
+                        node.status = NodeStatus.FAILED
+                        self.save_checkpoint(node)
+                        self._hooks_adapter.on_node_error(self.pipeline_id, node.node_id, e, [])
+                        raise
+                    # 运行成功：同样先存盘再通知，每个节点只保存一次最终检查点
                     node.status = NodeStatus.COMPLETED
                     self.save_checkpoint(node)
                     self._hooks_adapter.on_node_finish(self.pipeline_id, node.node_id)
-                except Exception as e:
-                    # 运行失败，立即显式更新并保存检查点
-                    node.status = NodeStatus.FAILED
-                    self.save_checkpoint(node)
-                    self._hooks_adapter.on_node_error(self.pipeline_id, node.node_id, e, [])
-                    raise
-                finally: node.close()
+                finally:
+                    # 存盘或 Hooks 抛错时也要关闭节点，避免写入器泄漏
+                    node.close()
         except Exception as e:
             success = False; error = e; raise
         finally: self.close(success, error)
@@ -372,65 +514,154 @@ class SequentialPipeline(NodePipeline, ISequentialPipeline):
 
 class StreamingPipeline(NodePipeline, IStreamingPipeline):
     """流式执行引擎：并行运行节点"""
+    _CANCEL_SENTINEL = object() # cancel() 投递到完成队列的唤醒信号
+    _done_queue: Optional["queue.SimpleQueue"] = None
+    # 线程池随 Pipeline 实例常驻，多次 run() (如反复恢复) 不再重复创建线程；持有方不再使用时调用 shutdown() 释放
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_size = 0
+    # 并行节点共用一个按 parallel_size 之和定容的批处理线程池，取代每个节点各自的嵌套线程池
+    _share_batch_executor = True
+    _batch_executor: Optional[ThreadPoolExecutor] = None
+    _batch_executor_size = 0
+
+    def open(self):
+        super().open()
+        self._ensure_executors()
+
+    def _ensure_executors(self):
+        """按当前节点规模准备常驻线程池，规模不足时才重建"""
+        size = max(len(self.nodes), 1)
+        if self._executor is None or self._executor_size < size:
+            if self._executor is not None: self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="StreamingNode")
+            self._executor_size = size
+
+        if not self._share_batch_executor: return
+        parallel = [n for n in self.nodes if getattr(n, 'parallel_size', 1) > 1 and hasattr(n, 'set_executor')]
+        total = sum(n.parallel_size for n in parallel)
+        if not total: return
+        if self._batch_executor is None or self._batch_executor_size < total:
+            if self._batch_executor is not None: self._batch_executor.shutdown(wait=False)
+            self._batch_executor = ThreadPoolExecutor(max_workers=total, thread_name_prefix="StreamingBatch")
+            self._batch_executor_size = total
+        for node in parallel:
+            node.set_executor(self._batch_executor)
+
+    def shutdown(self, wait: bool = True):
+        """释放常驻线程池 (Pipeline 不再使用时调用；之后再 run() 会按需重建；未调用时随实例回收)"""
+        for attr in ("_executor", "_batch_executor"):
+            executor = getattr(self, attr)
+            if executor is not None:
+                executor.shutdown(wait=wait)
+                setattr(self, attr, None)
+        self._executor_size = self._batch_executor_size = 0
+
+    def adopt_executors(self, other: "StreamingPipeline"):
+        """接管另一个引擎实例的常驻线程池（Master 恢复时重建引擎，线程不随之重建）"""
+        for attr in ("_executor", "_executor_size", "_batch_executor", "_batch_executor_size"):
+            setattr(self, attr, getattr(other, attr))
+        other._executor = other._batch_executor = None
+        other._executor_size = other._batch_executor_size = 0
+
+    def cancel(self):
+        super().cancel()
+        # 直接唤醒调度线程，无需等待下一次轮询
+        done_queue = self._done_queue
+        if done_queue is not None:
+            done_queue.put(self._CANCEL_SENTINEL)
+
+    def _on_node_done(self, node: INode, error: Optional[Exception]) -> bool:
+        """统一处理单个节点的结束：成功则落盘完成状态，失败则进入取消流程。返回是否成功"""
+        if error is None:
+            # 只有在非取消状态下正常结束，才标记为已完成
+            if not self._cancelled:
+                node.status = NodeStatus.COMPLETED
+                self.save_checkpoint(node)
+                self._hooks_adapter.on_node_finish(self.pipeline_id, node.node_id)
+            node.close()
+            return True
+
+        _platform_logger.error("🚨 [Streaming] 节点 %s 异常，正在取消 Pipeline...", node.node_id)
+        node.status = NodeStatus.FAILED
+        self.save_checkpoint(node)
+        self._hooks_adapter.on_node_error(self.pipeline_id, node.node_id, error, [])
+        # 核心改进：进入取消流程，不立即退出，等待其他线程
+        self.cancel()
+        return False
+
     def run(self):
+        self._cancelled = False
         self._shutdown_event.clear()
         self.open()
         
         print(f"\n🚀 [Streaming] 正在并行启动所有节点...")
-        _platform_logger.info(f"🚀 [Streaming] Pipeline 启动: {self.pipeline_id}")
+        _platform_logger.info("🚀 [Streaming] Pipeline 启动: %s", self.pipeline_id)
             
         success = True; error = None
+        futures: Dict[Any, INode] = {}
         try:
             # 核心修复：同步预热
             # 在启动并行线程池之前，先同步执行所有非完成节点的 open()
             # 确保上游的 unseal (撕封条) 动作绝对领先于下游 Reader 对 EOF 的判定
             for node in self.nodes:
                 if node.status != NodeStatus.COMPLETED:
-                    # 预先注入 Context 并执行 open
-                    node_ctx = self._create_node_context(node)
+                    # 复用 open() 阶段已注入的同一 Context 执行 open
+                    node_ctx = self._node_ctx_by_id.get(node.node_id) or self._create_node_context(node)
                     node.open(ctx=node_ctx)
 
             for node in self.nodes:
                 if node.status == NodeStatus.COMPLETED:
-                    _platform_logger.info(f"⏭️  [Streaming] 节点 {node.node_id} 已完成，跳过调度")
+                    _platform_logger.info("⏭️  [Streaming] 节点 %s 已完成，跳过调度", node.node_id)
                     continue
                 self._hooks_adapter.on_node_start(self.pipeline_id, node.node_id, {})
 
-            with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
-                futures = {executor.submit(node.run): node for node in self.nodes if node.status != NodeStatus.COMPLETED}
-                pending = set(futures.keys())
-                while pending:
-                    if self._shutdown_event.is_set():
-                        for f in pending: f.cancel()
-                        break
-                    done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
-                    for f in done:
-                        node = futures[f]
-                        try:
-                            f.result()
-                            # 只有在非取消状态下正常结束，才标记为已完成
-                            if not self._shutdown_event.is_set():
-                                node.status = NodeStatus.COMPLETED
-                                self.save_checkpoint(node)
-                                self._hooks_adapter.on_node_finish(self.pipeline_id, node.node_id)
-                            node.close()
-                        except Exception as e:
-                            _platform_logger.error(f"🚨 [Streaming] 节点 {node.node_id} 异常，正在取消 Pipeline...")
-                            node.status = NodeStatus.FAILED
-                            self.save_checkpoint(node)
-                            self._hooks_adapter.on_node_error(self.pipeline_id, node.node_id, e, [])
-                            # 核心改进：进入取消流程，不立即退出，等待其他线程
-                            self.cancel()
-                            success = False
-                            error = e
-                            break
-                
-                # 如果失败，等待剩余任务收尾
-                if not success:
-                    wait(pending, timeout=5.0)
+            runnable = [node for node in self.nodes if node.status != NodeStatus.COMPLETED]
+            if len(runnable) == 1 and self._inline_single_node:
+                # 只剩一个可运行节点 (如恢复到最后一段)：直接在当前线程执行，省去线程派发与上下文切换
+                node = runnable[0]
+                try:
+                    node.run()
+                except Exception as e:
+                    success = False; error = e
+                self._on_node_done(node, error)
+                return
+
+            executor = self._executor
+            # 事件驱动：每个 future 完成时把自己投进队列，cancel() 投递哨兵，调度线程只在有事发生时醒来
+            done_queue = queue.SimpleQueue()
+            self._done_queue = done_queue
+            if self._cancelled:
+                done_queue.put(self._CANCEL_SENTINEL)
+            for node in runnable:
+                f = executor.submit(node.run)
+                futures[f] = node
+                f.add_done_callback(done_queue.put)
+
+            outstanding = len(futures)
+            while outstanding:
+                f = done_queue.get()
+                if f is self._CANCEL_SENTINEL:
+                    # 撤销尚未开始的任务；运行中的节点会自行响应取消，继续收取它们的结果
+                    for p in futures: p.cancel()
+                    continue
+                outstanding -= 1
+                if f.cancelled():
+                    continue
+                try:
+                    f.result(); exc = None
+                except Exception as e:
+                    exc = e
+                if not self._on_node_done(futures[f], exc):
+                    success = False
+                    error = exc
+                    break
+
         except Exception as e:
             success = False; error = e; raise
         finally:
+            # 等待剩余任务收尾：线程池常驻，不再随 with 块关闭，需显式等齐本轮提交的所有节点
+            if futures: wait(futures)
+            self._done_queue = None
             if self._status == PipelineStatus.CANCELING.value:
                 self._status = PipelineStatus.CANCELED.value
             self.close(success, error)
@@ -454,7 +685,7 @@ class UnifiedNodePipeline(BasePipeline):
                  results_dir: str = "tmp/results",
                  writer_config: Optional[WriterConfig] = None):
         super().__init__(hooks=hooks, results_dir=results_dir, writer_config=writer_config)
-        self._nodes = nodes or []
+        self.nodes = nodes or []
         self._streaming = streaming
         self._batch_size = batch_size
         self._parallel_size = parallel_size
@@ -468,13 +699,8 @@ class UnifiedNodePipeline(BasePipeline):
         if streaming is not None:
             self._streaming = streaming
         
-        # 选型引擎实现
-        engine_cls = StreamingPipeline if self._streaming else SequentialPipeline
-        self._impl = engine_cls(hooks=self._hooks, results_dir=self.results_dir, writer_config=self.writer_config)
-        
-        # 同步状态给实现层
-        self._impl._pipeline_id = self.pipeline_id
-        self._impl.nodes = self._nodes
+        # 选型引擎实现，并同步状态给实现层
+        self._bind_engine()
         self._impl.config = self.config
         
         # 物理创建完成后立即持久化蓝图
@@ -491,10 +717,25 @@ class UnifiedNodePipeline(BasePipeline):
         })
         return rt
 
+    def _bind_engine(self):
+        """按 streaming 选型并新建引擎；旧引擎的常驻线程池由同类新引擎接管，否则释放"""
+        engine_cls = StreamingPipeline if self._streaming else SequentialPipeline
+        old, self._impl = self._impl, engine_cls(hooks=self._hooks, results_dir=self.results_dir, writer_config=self.writer_config)
+        if isinstance(old, StreamingPipeline) and isinstance(self._impl, StreamingPipeline):
+            self._impl.adopt_executors(old)
+        elif old is not None:
+            old.shutdown(wait=False)
+        self._impl._pipeline_id = self.pipeline_id
+        self._impl.nodes = self._nodes
+
     def run(self):
         if not self._impl: raise RuntimeError("Pipeline not created or resumed.")
         return self._impl.run()
 
+    def shutdown(self, wait: bool = True):
+        """释放引擎的常驻线程池"""
+        if self._impl: self._impl.shutdown(wait)
+
     def cancel(self):
         """信号下发"""
         if self._impl: self._impl.cancel()
@@ -508,10 +749,7 @@ class UnifiedNodePipeline(BasePipeline):
         self._parallel_size = runtime_data.get("parallel_size", 1)
         
         # 选型引擎
-        engine_cls = StreamingPipeline if self._streaming else SequentialPipeline
-        self._impl = engine_cls(hooks=self._hooks, results_dir=self.results_dir, writer_config=self.writer_config)
-        self._impl._pipeline_id = self.pipeline_id
-        self._impl.nodes = self._nodes
+        self._bind_engine()
         
         # 引擎层恢复实时进度
         self._impl.resume_from_runtime(runtime_data)
@@ -522,6 +760,8 @@ class UnifiedNodePipeline(BasePipeline):
     def status(self) -> str: return self._impl.status if self._impl else super().status
     @property
     def nodes(self) -> List[INode]: return self._impl.nodes if self._impl else self._nodes
+    @nodes.setter
+    def nodes(self, value: List[INode]): BasePipeline.nodes.fset(self, value)
     def get_duration(self) -> float: return self._impl.get_duration() if self._impl else super().get_duration()
 
     def __getattr__(self, name): 
@@ -601,11 +841,11 @@ class UnifiedOperatorPipeline(UnifiedNodePipeline):
         if not self._input_uri or not self._output_uri:
             raise ValueError(f"Pipeline '{self._pipeline_id}' requires both 'input_uri' and 'output_uri'.")
             
-        _platform_logger.info(f"🏗️  正在编排逻辑蓝图: {self._pipeline_id}")
+        _platform_logger.info("🏗️  正在编排逻辑蓝图: %s", self._pipeline_id)
         
         plans = self._plan_topology(node_configs)
         self._weld_topology(plans)
-        self._nodes = self._materialize_topology(plans)
+        self.nodes = self._materialize_topology(plans)
         self._clear_streams_if_needed()
 
         # 2. 调用父类 (UnifiedNodePipeline) 完成引擎选型与持久化
@@ -632,7 +872,7 @@ class UnifiedOperatorPipeline(UnifiedNodePipeline):
         self._default_protocol = runtime_data.get("default_protocol", "jsonl://")
         
         # 重建物理节点
-        self._nodes = self._reconstruct_topology(runtime_data)
+        self.nodes = self._reconstruct_topology(runtime_data)
         
         # 恢复物理配置与引擎
         super().resume_from_runtime(runtime_data)
@@ -641,50 +881,66 @@ class UnifiedOperatorPipeline(UnifiedNodePipeline):
     # --- 逻辑编排工具方法 (保留原 BaseOperatorPipeline 的精华) ---
     def _plan_topology(self, node_configs: Optional[List[NodeConfig]] = None) -> List[Dict]:
         """构建逻辑蓝图：将算子和 I/O 搬运工统一"""
-        plans = []
-        plans.append({"node_id": "input", "type": "io_in", "config": {"input_uri": self._input_uri, "batch_size": self._batch_size, "parallel_size": self._parallel_size, "protocol_prefix": self._protocol_prefix, "base_path": self._base_path}})
+        # 所有节点共享的默认配置只构造一次，各节点在其基础上合并自身差异
+        common_conf = {"batch_size": self._batch_size, "parallel_size": self._parallel_size, "protocol_prefix": self._protocol_prefix, "base_path": self._base_path}
+        n_conf = len(node_configs) if node_configs else 0
+        plans = [None] * (len(self._operators) + 2)
+        plans[0] = {"node_id": "input", "type": "io_in", "config": {**common_conf, "input_uri": self._input_uri}}
         for i, op in enumerate(self._operators):
-            raw_conf = node_configs[i] if (node_configs and i < len(node_configs)) else {}
-            conf_dict = raw_conf.to_dict() if isinstance(raw_conf, NodeConfig) else raw_conf
-            full_conf = {"batch_size": self._batch_size, "parallel_size": self._parallel_size, "protocol_prefix": self._protocol_prefix, "base_path": self._base_path}
-            full_conf.update(conf_dict)
-            plans.append({"node_id": f"node_{i}", "type": "functional", "operator": op, "config": full_conf})
-        plans.append({"node_id": "output", "type": "io_out", "config": {"output_uri": self._output_uri, "batch_size": self._batch_size, "parallel_size": self._parallel_size, "protocol_prefix": self._protocol_prefix, "base_path": self._base_path}})
+            raw_conf = node_configs[i] if i < n_conf else None
+            conf_dict = raw_conf.to_dict() if isinstance(raw_conf, NodeConfig) else (raw_conf or {})
+            plans[i + 1] = {"node_id": f"node_{i}", "type": "functional", "operator": op, "config": {**common_conf, **conf_dict}}
+        plans[-1] = {"node_id": "output", "type": "io_out", "config": {**common_conf, "output_uri": self._output_uri}}
         return plans
 
     def _weld_topology(self, plans: List[Dict]):
-        for i in range(len(plans)):
-            conf = plans[i]["config"]
-            if i > 0:
-                prev_conf = plans[i-1]["config"]
-                if conf.get("input_uri") and not prev_conf.get("output_uri"): prev_conf["output_uri"] = conf["input_uri"]
-                elif not conf.get("input_uri") and prev_conf.get("output_uri"): conf["input_uri"] = prev_conf["output_uri"]
-                elif conf.get("input_uri") and prev_conf.get("output_uri") and conf["input_uri"] != prev_conf["output_uri"]:
-                    raise ValueError(f"Topology Error: URI mismatch between {plans[i-1]['node_id']} and {plans[i]['node_id']}")
-        for i, plan in enumerate(plans):
-            conf = plan["config"]
-            if not conf.get("output_uri") and i < len(plans) - 1:
-                proto = self._default_protocol; ext = get_protocol_extension(proto)
-                conf["output_uri"] = f"{proto}{self._pipeline_id.strip('/')}/{plan['node_id']}{ext}"
-                plans[i+1]["config"]["input_uri"] = conf["output_uri"]
+        """单趟前向焊接：逐对对齐相邻节点的 URI，两端都未指定时生成默认中间流地址"""
+        proto = self._default_protocol
+        uri_prefix = f"{proto}{self._pipeline_id.strip('/')}/"
+        ext = get_protocol_extension(proto)
+        for i in range(len(plans) - 1):
+            plan, nxt = plans[i], plans[i + 1]
+            conf, next_conf = plan["config"], nxt["config"]
+            out_uri = conf.get("output_uri"); in_uri = next_conf.get("input_uri")
+            if in_uri and not out_uri: conf["output_uri"] = in_uri
+            elif out_uri and not in_uri: next_conf["input_uri"] = out_uri
+            elif in_uri and out_uri:
+                if in_uri != out_uri:
+                    raise ValueError(f"Topology Error: URI mismatch between {plan['node_id']} and {nxt['node_id']}")
+            else:
+                conf["output_uri"] = next_conf["input_uri"] = f"{uri_prefix}{plan['node_id']}{ext}"
 
     def _materialize_topology(self, plans: List[Dict]) -> List[INode]:
-        final_nodes = []
+        # 流按“边界”构建：streams[k] 是 plans[k-1] 与 plans[k] 之间的总线，相邻节点共享同一个流对象
+        # (streams[0] 为源，streams[n] 为汇)。中间流的路径按生产方配置解析，保证读写的是同一物理文件
+        if not plans: return []
+        streams = [self._create_stream(plans[0]["config"].get("input_uri"), plans[0]["config"], self._input_uri)]
         for plan in plans:
+            conf = plan["config"]
+            streams.append(self._create_stream(conf.get("output_uri"), conf, self._output_uri))
+
+        final_nodes = []
+        for k, plan in enumerate(plans):
             conf = plan["config"]; nid = plan["node_id"]; ntype = plan["type"]
             in_uri = conf.get("input_uri"); out_uri = conf.get("output_uri")
-            in_prefix = "" if in_uri == self._input_uri else (conf.get("protocol_prefix") or "")
-            out_prefix = "" if out_uri == self._output_uri else (conf.get("protocol_prefix") or "")
-            in_base = "" if in_uri == self._input_uri else (conf.get("base_path") or "")
-            out_base = "" if out_uri == self._output_uri else (conf.get("base_path") or "")
-            in_s = self._bus_factory.create(in_uri, protocol_prefix=in_prefix, base_path=in_base) if in_uri else StreamFactory.create(None)
-            out_s = self._bus_factory.create(out_uri, protocol_prefix=out_prefix, base_path=out_base) if out_uri else StreamFactory.create(None)
+            in_s = streams[k]; out_s = streams[k + 1]
+            if k > 0 and in_uri != plans[k - 1]["config"].get("output_uri"):
+                # 蓝图未焊接一致 (如手工改写的 runtime)：退回按本节点配置单独解析
+                in_s = self._create_stream(in_uri, conf, self._input_uri)
             if ntype == "io_in": node = InputNode(input_uri=in_uri, output_uri=out_uri, batch_size=conf.get("batch_size", 1), parallel_size=conf.get("parallel_size", 1), protocol_prefix=conf.get("protocol_prefix", ""), base_path=conf.get("base_path", ""))
             elif ntype == "io_out": node = OutputNode(input_uri=in_uri, output_uri=out_uri, batch_size=conf.get("batch_size", 1), parallel_size=conf.get("parallel_size", 1), protocol_prefix=conf.get("protocol_prefix", ""), base_path=conf.get("base_path", ""))
             else: node = UnifiedOperatorNode(operator=plan["operator"], node_id=nid, input_uri=in_uri, output_uri=out_uri, batch_size=conf.get("batch_size", 1), parallel_size=conf.get("parallel_size", 1), protocol_prefix=conf.get("protocol_prefix", ""), base_path=conf.get("base_path", ""))
             node.bind_io(in_s, out_s); final_nodes.append(node)
         return final_nodes
 
+    def _create_stream(self, uri: Optional[str], conf: Dict[str, Any], external_uri: Optional[str]):
+        """用户直接给出的源/汇 URI 不拼接前缀与根目录，中间流按节点配置拼接"""
+        if not uri: return StreamFactory.create(None)
+        external = uri == external_uri
+        prefix = "" if external else (conf.get("protocol_prefix") or "")
+        base = "" if external else (conf.get("base_path") or "")
+        return self._bus_factory.create(uri, protocol_prefix=prefix, base_path=base)
+
     def _reconstruct_topology(self, runtime_data: Dict[str, Any]) -> List[INode]:
         node_states = runtime_data.get("nodes", []); plans = []; func_idx = 0
         for ns in node_states:
@@ -701,14 +957,16 @@ class UnifiedOperatorPipeline(UnifiedNodePipeline):
 
     def _clear_streams_if_needed(self):
         source = self._nodes[0].input_stream if self._nodes else None
-        for n in self._nodes:
-            if hasattr(n, 'output_stream') and n.output_stream and n.output_stream != source: n.output_stream.clear_data()
+        StreamFactory.clear_many(
+            n.output_stream for n in self._nodes
+            if hasattr(n, 'output_stream') and n.output_stream and n.output_stream != source
+        )
         res_dir = os.path.join(self.results_dir, self.pipeline_id)
-        for target in ["checkpoint.json", "report.json", "runtime.json"]:
-            path = os.path.join(res_dir, target)
-            if os.path.exists(path):
-                try: os.remove(path); _platform_logger.info(f"  🗑️  已物理删除旧文件: {target}")
-                except Exception as e: _platform_logger.warning(f"  ⚠️  删除 {target} 失败: {e}")
+        for target in ("checkpoint.json", "report.json", "runtime.json"):
+            # 直接删除，不存在即跳过：省去逐个 exists() 的额外 stat
+            try: os.remove(os.path.join(res_dir, target)); _platform_logger.info("  🗑️  已物理删除旧文件: %s", target)
+            except FileNotFoundError: pass
+            except Exception as e: _platform_logger.warning("  ⚠️  删除 %s 失败: %s", target, e)
 
 
 # 别名，向后兼容
@@ -1,90 +1,333 @@
 import threading
 import os
-import pandas as pd
-from typing import List, Any
+import io
+import re
+import csv
+import functools
+from typing import List, Any, Optional, Tuple, Callable
 from llm_datagen.core.storage import IStorage
+from llm_datagen.util.flusher import flusher
+
+_SCAN_CHUNK = 1 << 20 # 行计数扫描块大小 (1 MiB)
+
+
+@functools.lru_cache(maxsize=128)
+def _count_rows(path: str, mtime_ns: int, file_size: int) -> int:
+    """
+    按字节扫描统计 CSV 物理记录数（不含表头）。
+    只跟踪“引号内/引号外”两种状态，仅计引号外的换行，因此单元格内换行不会被误计。
+    以 (path, mtime_ns, size) 为缓存键，文件未变化时重复调用为 O(1)。
+    """
+    newlines = 0
+    in_quote = False
+    last = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_SCAN_CHUNK)
+            if not chunk:
+                break
+            last = chunk[-1:]
+            quotes = chunk.count(b'"')
+            if not quotes:
+                # 快速路径：整块无引号，状态不变；仅在引号外时计入换行 (bytes.count 为 C 层 memchr 扫描)
+                if not in_quote:
+                    newlines += chunk.count(b'\n')
+                continue
+            if b'\n' not in chunk:
+                # 有引号但无换行：只需翻转引号状态，无需切分
+                in_quote ^= bool(quotes & 1)
+                continue
+            # 按引号切分后奇偶段交替处于引号内外；转义的 "" 产生空段，不影响奇偶
+            parts = chunk.split(b'"')
+            start = 1 if in_quote else 0
+            for i in range(start, len(parts), 2):
+                newlines += parts[i].count(b'\n')
+            if quotes & 1:
+                in_quote = not in_quote
+    if file_size == 0:
+        return 0
+    # 末行没有换行符且引号已闭合时视为完整记录补计一行（与 CsvStorage 读取索引同一规则），再扣除表头
+    rows = newlines + (1 if last != b'\n' and not in_quote else 0)
+    return max(rows - 1, 0)
+
+
+_INT_RE = re.compile(r'[-+]?\d+\Z')
+_FLOAT_RE = re.compile(r'[-+]?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?\Z|[-+]?(inf|Inf|INF|infinity|Infinity)\Z')
+_BOOL_MAP = {"True": True, "TRUE": True, "true": True, "False": False, "FALSE": False, "false": False}
+# 与 pandas.read_csv 默认 na_values 一致：这些单元格读回 None
+_NA_VALUES = frozenset((
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+))
+
+
+def _infer_column(values: List[str]) -> List[Any]:
+    """
+    按列推断类型（与原先 pandas.read_csv 按页推断同口径）：
+    NA 单元格为 None；其余单元格全部是整数 / 浮点 / 布尔字面量时整列转换，否则整列保留原字符串，
+    因此 "007" 这类编号在混有文本的列中不会丢失前导零。
+    与 pandas 的差异：含 NA 的整数列保持 int（pandas 会升级为 float）。
+    """
+    na = _NA_VALUES
+    present = [v for v in values if v not in na]
+    if not present:
+        return [None] * len(values)
+    if all(map(_INT_RE.match, present)):
+        conv = int
+    elif all(map(_FLOAT_RE.match, present)):
+        conv = float
+    elif all(v in _BOOL_MAP for v in present):
+        conv = _BOOL_MAP.__getitem__
+    else:
+        return [None if v in na else v for v in values]
+    return [None if v in na else conv(v) for v in values]
+
+def _make_escape(delimiter: str) -> Callable[[Any], str]:
+    """单元格转义（等价于 csv.QUOTE_MINIMAL）：仅在含分隔符/引号/换行时才走加引号的慢路径"""
+    needs_quote = re.compile('[%s"\r\n]' % re.escape(delimiter)).search
+
+    def _esc(v: Any) -> str:
+        if v is None:
+            return ''
+        t = type(v)
+        if t is int or t is float or t is bool:
+            return str(v)
+        s = v if t is str else str(v)
+        if needs_quote(s) is None:
+            return s
+        return '"' + s.replace('"', '""') + '"'
+    return _esc
+
+
+@functools.lru_cache(maxsize=64)
+def _row_encoder(fields: Tuple[str, ...], delimiter: str) -> Callable[[dict], str]:
+    """
+    按表头一次性生成专用的行编码函数：每列的取值与转义被内联为一条格式化表达式，
+    省去 DictWriter 逐行逐列的通用分派。结果按 (列序, 分隔符) 缓存。
+    """
+    esc = _make_escape(delimiter)
+    if len(fields) == 1:
+        # 单列空值必须写成 ""，否则会被读成空行
+        key = fields[0]
+        return lambda r: (esc(r.get(key)) or '""') + '\n'
+    template = delimiter.replace('%', '%%').join(['%s'] * len(fields)) + '\n'
+    args = ", ".join("_e(_g(%r))" % f for f in fields)
+    src = "def _enc(r, _e=_esc, _t=%r):\n    _g = r.get\n    return _t %% (%s,)\n" % (template, args)
+    namespace = {"_esc": esc}
+    exec(compile(src, "<csv_row_encoder>", "exec"), namespace)
+    return namespace["_enc"]
+
 
 class CsvStorage(IStorage):
     """
-    基于 Pandas 实现的 CSV 存储
+    基于标准库 csv 实现的 CSV 存储（无第三方依赖）
     能够正确处理单元格内换行符，确保进度统计准确。
     """
-    def __init__(self, file_path: str, delimiter: str = ','):
+    def __init__(self, file_path: str, delimiter: str = ',', max_batch_bytes: int = 1 << 20, max_batch_delay: float = 0.1):
         self.file_path = file_path
         self.delimiter = delimiter
+        # 组提交：行先编码进待写缓冲，超过字节阈值或首条待写数据等待超过 max_batch_delay 秒 (共享的后台冲刷线程) 后一次性落盘
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_delay = max_batch_delay
+        self._write_lock = threading.Lock()
+        self._fh = None # 常驻追加句柄，避免每批重复 open/close
+        self._pending = bytearray()
+        self._flush_scheduled = False # 当前缓冲窗口是否已向后台冲刷线程登记
+        self._write_fields: Optional[List[str]] = None
         self._done_file = f"{file_path}.done"
         self._cached_size = None # 实例级缓存
+        # 行偏移索引：只覆盖已完整落盘的记录，新数据到达时仅增量扫描尾部
+        self._index_lock = threading.Lock()
+        self._fieldnames: Optional[List[str]] = None
+        self._data_start = 0 # 表头之后第一条记录的字节偏移
+        self._row_ends: List[int] = [] # 第 i 条记录的结束字节偏移 (不含)
+        self._indexed_bytes = 0 # 已扫描到的完整记录边界
         os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
 
+    def _resolve_fields(self, valid_items: List[dict]) -> List[str]:
+        """确定写入列：已有文件沿用其表头，新文件按首批数据的键序生成表头"""
+        if os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0:
+            with open(self.file_path, 'rb') as f, self._index_lock:
+                if self._refresh_index(f):
+                    # 末条记录没有换行符：先补齐换行，避免新记录接在其后
+                    self._pending += b'\n'
+                if self._fieldnames is not None:
+                    return list(self._fieldnames)
+        fields = list(dict.fromkeys(k for item in valid_items for k in item))
+        self._encode_rows([], fields, header=True)
+        return fields
+
+    def _encode_rows(self, rows: List[dict], fields: List[str], header: bool = False) -> None:
+        """把一批记录编码为 CSV 字节并追加到待写缓冲（表头之外的键被忽略）"""
+        enc = _row_encoder(tuple(fields), self.delimiter)
+        parts = [enc(dict(zip(fields, fields)))] if header else []
+        parts.extend(map(enc, rows))
+        self._pending += ''.join(parts).encode('utf-8')
+
     def append(self, items: List[Any]) -> None:
         if not items:
             return
-        
+
         valid_items = [item if isinstance(item, dict) else {"data": item} for item in items]
-        df = pd.DataFrame(valid_items)
-        
-        file_exists = os.path.exists(self.file_path)
-        
-        df.to_csv(
-            self.file_path, 
-            mode='a', 
-            index=False, 
-            header=not file_exists, 
-            sep=self.delimiter,
-            encoding='utf-8'
-        )
-        
+        with self._write_lock:
+            if self._write_fields is None:
+                self._write_fields = self._resolve_fields(valid_items)
+            self._encode_rows(valid_items, self._write_fields)
+            if len(self._pending) >= self.max_batch_bytes:
+                self._flush_locked()
+            elif not self._flush_scheduled:
+                # 写入方停顿时也保证已确认的数据最迟 max_batch_delay 秒后落盘，对其他进程的读者可见
+                self._flush_scheduled = True
+                flusher.schedule(self.flush_batch, self.max_batch_delay)
+
         # 仅更新本实例缓存
         if self._cached_size is not None:
             self._cached_size += len(valid_items)
 
+    def _flush_locked(self) -> None:
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        if self._fh is None:
+            self._fh = open(self.file_path, 'ab')
+        self._fh.write(self._pending)
+        self._fh.flush()
+        self._pending.clear()
+
+    def flush_batch(self) -> None:
+        """将组提交缓冲立即落盘（读取、计数、封条及检查点前调用）"""
+        if self._pending:
+            with self._write_lock:
+                self._flush_locked()
+
+    def close(self) -> None:
+        """落盘待写缓冲并释放追加句柄（之后再 append 会重新打开）"""
+        with self._write_lock:
+            self._flush_locked()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            self._write_fields = None
+
+    def __del__(self):
+        try: self.close()
+        except Exception: pass
+
+    def _close_handle(self) -> None:
+        """丢弃待写缓冲并释放追加句柄（仅用于 clear）"""
+        with self._write_lock:
+            self._flush_scheduled = False
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            self._pending.clear()
+            self._write_fields = None
+
+    def _reset_index(self):
+        self._fieldnames = None
+        self._data_start = 0
+        self._row_ends = []
+        self._indexed_bytes = 0
+
+    def _refresh_index(self, f) -> int:
+        """
+        从上次的完整记录边界继续扫描，补齐新增记录的字节偏移（调用方持有 _index_lock）
+        返回文件末尾无换行、但引号已闭合的最后一条记录的结束偏移（无则为 0）：
+        该记录视为完整可读，但不进入索引，写入方补齐换行后照常增量扫描
+        """
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < self._indexed_bytes:
+            # 文件被截断或重建，索引作废
+            self._reset_index()
+        if file_size == self._indexed_bytes:
+            return 0
+
+        f.seek(self._indexed_bytes)
+        pos = boundary = self._indexed_bytes
+        quotes = 0
+        header_lines = []
+        row_ends = self._row_ends
+        tail_end = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                # 引号未闭合的尾部半行尚未写完，留待下次扫描
+                if self._fieldnames is not None and not (quotes + line.count(b'"')) & 1:
+                    tail_end = pos + len(line)
+                break
+            pos += len(line)
+            quotes += line.count(b'"')
+            if self._fieldnames is None:
+                header_lines.append(line)
+            if quotes & 1:
+                continue # 引号未闭合：单元格内换行，记录尚未结束
+            quotes = 0
+            if self._fieldnames is None:
+                header = b''.join(header_lines).decode('utf-8-sig')
+                self._fieldnames = next(csv.reader(io.StringIO(header, newline=''), delimiter=self.delimiter), [])
+                self._data_start = pos
+            else:
+                row_ends.append(pos)
+            boundary = pos
+        self._indexed_bytes = boundary
+        return tail_end
+
     def read(self, offset: int, limit: int) -> List[Any]:
-        if not os.path.exists(self.file_path):
+        """借助行偏移索引直接 seek 到目标记录，每页开销与 offset 无关"""
+        if limit <= 0:
             return []
-            
+        self.flush_batch()
         try:
-            df = pd.read_csv(
-                self.file_path,
-                sep=self.delimiter,
-                skiprows=range(1, offset + 1) if offset > 0 else None,
-                nrows=limit,
-                encoding='utf-8'
-            )
-            return df.where(pd.notnull(df), None).to_dict('records')
-        except pd.errors.EmptyDataError:
+            with open(self.file_path, 'rb') as f:
+                with self._index_lock:
+                    tail_end = self._refresh_index(f)
+                    row_ends = self._row_ends
+                    indexed = len(row_ends)
+                    total = indexed + (tail_end > 0)
+                    if self._fieldnames is None or offset >= total:
+                        return []
+                    fieldnames = self._fieldnames
+                    start = row_ends[offset - 1] if offset > 0 else self._data_start
+                    stop = min(offset + limit, total)
+                    end = row_ends[stop - 1] if stop <= indexed else tail_end
+                f.seek(start)
+                data = f.read(end - start).decode('utf-8')
+        except FileNotFoundError:
             return []
-        except Exception:
+
+        rows = list(csv.reader(io.StringIO(data, newline=''), delimiter=self.delimiter))
+        if not rows:
             return []
+        # 按列推断本页类型；短行缺失的单元格按空值处理
+        width = len(fieldnames)
+        columns = [_infer_column([row[j] if j < len(row) else '' for row in rows]) for j in range(width)]
+        return [dict(zip(fieldnames, values)) for values in zip(*columns)]
 
     def size(self) -> int:
         """
-        利用 Pandas 引擎准确统计物理记录数。
+        按字节扫描准确统计物理记录数（正确跳过引号内的换行）。
         """
-        if not os.path.exists(self.file_path):
-            return 0
-            
-        if self._cached_size is not None:
+        self.flush_batch()
+        if self._cached_size is not None and os.path.exists(self.file_path):
             return self._cached_size
-            
+
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return 0
         try:
-            df_iter = pd.read_csv(
-                self.file_path, 
-                sep=self.delimiter, 
-                usecols=[0], 
-                chunksize=10000, 
-                encoding='utf-8'
-            )
-            self._cached_size = sum(len(chunk) for chunk in df_iter)
+            self._cached_size = _count_rows(self.file_path, st.st_mtime_ns, st.st_size)
             return self._cached_size
-        except Exception:
+        except OSError:
             return 0
 
     def clear(self) -> None:
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
-        if os.path.exists(self._done_file):
-            os.remove(self._done_file)
+        self._close_handle()
+        for path in (self.file_path, self._done_file):
+            try: os.remove(path)
+            except FileNotFoundError: pass
         self._cached_size = 0
+        with self._index_lock:
+            self._reset_index()
 
     def reset_finished(self):
         """核心修复：撕掉旧封条，让流重新激活"""
@@ -93,6 +336,7 @@ class CsvStorage(IStorage):
         self._cached_size = None
 
     def mark_finished(self):
+        self.close()
         with open(self._done_file, 'w', encoding='utf-8') as f:
             f.write("done")
 
@@ -1,15 +1,32 @@
 import os
 import json
-from typing import Any, List
+import threading
+from array import array
+from typing import Any, List, Optional, Tuple
 from llm_datagen.core.storage import IStorage
+from llm_datagen.util.atomic import atomic_write_text
+from llm_datagen.util.fastjson import dumps_bytes, loads
+from llm_datagen.util.flusher import flusher
+
+# O_BINARY 仅 Windows 存在，避免底层描述符做换行转换
+_APPEND_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0)
 
 class JsonlStorage(IStorage):
     """JSONL 文件存储实现，支持物理 EOF 标记"""
     
+    COUNT_CHUNK_SIZE = 1 << 20
+
     def __init__(self, file_path: str):
         self.file_path = file_path
         self._done_file = f"{file_path}.done" # 物理结束标记文件
+        self._count_file = f"{file_path}.count" # 行数边车文件：{"mtime_ns": ..., "size": ..., "rows": 行数}
         self._cached_size = None # 缓存计数
+        self._wrote = False # 本实例是否写过数据：只有自己写出的文件才在封条时落盘边车
+        self._write_lock = threading.Lock()
+        self._fd = None # 常驻 O_APPEND 文件描述符 (懒打开)，避免每批重复 open/close
+        # 行偏移索引：首次读取时扫描一次，此后新数据到达只增量扫描尾部
+        self._index_lock = threading.Lock()
+        self._reset_index()
         self._ensure_dir()
 
     def _ensure_dir(self):
@@ -17,47 +34,107 @@ class JsonlStorage(IStorage):
         if dir_path:
             os.makedirs(dir_path, exist_ok=True)
 
+    @staticmethod
+    def _encode_lines(items: List[Any]) -> List[bytes]:
+        # 修复：跳过空项 (None / 空字典)，避免写入空行
+        return [dumps_bytes(item) for item in items
+                if item is not None and not (isinstance(item, dict) and not item)]
+
+    def _write_lines(self, lines: List[bytes]) -> None:
+        """整批拼成一个字节块，直接 os.write 到 O_APPEND 描述符：无用户态缓冲，写完即对读者可见"""
+        if not lines:
+            return
+        payload = memoryview(b'\n'.join(lines) + b'\n')
+        with self._write_lock:
+            if self._fd is None:
+                self._fd = os.open(self.file_path, _APPEND_FLAGS, 0o644)
+            # 常规文件通常一次写完；被信号打断等导致的短写则续写剩余部分
+            while payload:
+                payload = payload[os.write(self._fd, payload):]
+            self._wrote = True
+            # 增量更新缓存
+            if self._cached_size is not None:
+                self._cached_size += len(lines)
+
     def append(self, items: List[Any]) -> None:
-        count = 0
-        with open(self.file_path, 'a', encoding='utf-8') as f:
-            for item in items:
-                # 修复：跳过空项，避免写入空行
-                if item is None:
-                    continue
-                # 修复：确保 item 是有效的字典或可序列化对象
-                if isinstance(item, dict) and not item:
-                    continue
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
-                count += 1
-        
-        # 增量更新缓存
-        if self._cached_size is not None:
-            self._cached_size += count
+        self._write_lines(self._encode_lines(items))
+
+    def _reset_index(self):
+        self._line_ends = array('q') # 第 i 行的结束字节偏移 (含换行符)
+        self._indexed_bytes = 0 # 已扫描到的完整行边界
+
+    def _refresh_index(self, f) -> int:
+        """从上次的完整行边界继续扫描，补齐新增行的字节偏移，返回当前文件字节数（调用方持有 _index_lock）"""
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < self._indexed_bytes:
+            # 文件被截断或重建，索引作废
+            self._reset_index()
+        if file_size == self._indexed_bytes:
+            return file_size
+
+        f.seek(self._indexed_bytes)
+        pos = self._indexed_bytes
+        line_ends = self._line_ends
+        while chunk := f.read(self.COUNT_CHUNK_SIZE):
+            i = chunk.find(b'\n')
+            while i >= 0:
+                line_ends.append(pos + i + 1)
+                i = chunk.find(b'\n', i + 1)
+            pos += len(chunk)
+        # 未以换行结尾的尾行不入索引，留待下次扫描（由 read 按需作为最后一行读取）
+        if line_ends:
+            self._indexed_bytes = line_ends[-1]
+        return file_size
 
     def read(self, offset: int, limit: int) -> List[Any]:
-        results = []
-        if not os.path.exists(self.file_path):
+        """借助行偏移索引直接 seek 到目标行，每页开销与 offset 无关"""
+        if limit <= 0:
             return []
-        
-        with open(self.file_path, 'r', encoding='utf-8') as f:
-            # 跳过 offset 行
-            for _ in range(offset):
-                if not f.readline():
-                    return []
-            
-            # 读取 limit 行
-            for _ in range(limit):
-                line = f.readline()
-                if not line:
-                    break
-                try:
-                    results.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
+        try:
+            with open(self.file_path, 'rb') as f:
+                with self._index_lock:
+                    file_size = self._refresh_index(f)
+                    line_ends = self._line_ends
+                    indexed = len(line_ends)
+                    # 无换行结尾的最后一行：已封条或本实例没有在写时视为完整行（与 size() 计数一致）；
+                    # 仍有写入方时可能是写了一半的行，留待下次读取
+                    tail = file_size > self._indexed_bytes and (self._fd is None or self.is_finished())
+                    if offset >= indexed + tail:
+                        return []
+                    start = line_ends[offset - 1] if offset > 0 else 0
+                    stop = min(offset + limit, indexed + tail)
+                    end = line_ends[stop - 1] if stop <= indexed else file_size
+                f.seek(start)
+                data = f.read(end - start)
+        except FileNotFoundError:
+            return []
+
+        lines = data.split(b'\n')
+        if stop <= indexed:
+            # 本页以换行结尾，split 末尾多出一个空串
+            lines.pop()
+        results = []
+        for line in lines:
+            try:
+                results.append(loads(line))
+            except json.JSONDecodeError:
+                continue
         return results
 
+    def _close_handle(self) -> None:
+        with self._write_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __del__(self):
+        try: self._close_handle()
+        except Exception: pass
+
     def mark_finished(self):
         """核心功能：在磁盘上创建结束标识"""
+        self._close_handle()
+        self._persist_count()
         with open(self._done_file, 'w', encoding='utf-8') as f:
             f.write("done")
 
@@ -66,27 +143,141 @@ class JsonlStorage(IStorage):
         return os.path.exists(self._done_file)
 
     def size(self) -> int:
-        """带缓存的计数，避免重复扫描全表"""
+        """带缓存的计数：热路径 O(1)；冷启动时边车与文件 (mtime_ns, size) 完全一致才复用，否则全量重算"""
         if not os.path.exists(self.file_path):
             return 0
         
         if self._cached_size is not None:
             return self._cached_size
-            
-        with open(self.file_path, 'r', encoding='utf-8') as f:
-            self._cached_size = sum(1 for _ in f)
+
+        with self._write_lock:
+            if self._cached_size is None:
+                rows = self._load_count(os.stat(self.file_path))
+                if rows is None:
+                    rows, _, partial = self._count_lines(0)
+                    rows += partial
+                self._cached_size = rows
             return self._cached_size
 
+    def _count_lines(self, start: int) -> Tuple[int, int, bool]:
+        """
+        从 start 起按块统计换行符 (bytes.count 走 C 层 memchr，不为每行创建对象)
+        返回 (完整行数, 最后一个换行之后的字节偏移, 是否存在未以换行结尾的尾行)
+        """
+        rows, last_end, pos = 0, start, start
+        with open(self.file_path, 'rb') as f:
+            f.seek(start)
+            while chunk := f.read(self.COUNT_CHUNK_SIZE):
+                n = chunk.count(b'\n')
+                if n:
+                    rows += n
+                    last_end = pos + chunk.rfind(b'\n') + 1
+                pos += len(chunk)
+        return rows, last_end, pos > last_end
+
+    def _load_count(self, st: os.stat_result) -> Optional[int]:
+        """读取边车行数；文件在记录之后被改写、替换或追加过 (mtime_ns / size 不符) 则视为失效"""
+        try:
+            with open(self._count_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["mtime_ns"] == st.st_mtime_ns and meta["size"] == st.st_size:
+                return int(meta["rows"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _persist_count(self) -> None:
+        """封条时将计数连同文件的 (mtime_ns, size) 落盘，重启后 size() 无需全量重扫；未写过数据的实例不落盘"""
+        if not self._wrote:
+            return
+        rows = self.size()
+        with self._write_lock:
+            try:
+                st = os.stat(self.file_path)
+                atomic_write_text(self._count_file, json.dumps({"mtime_ns": st.st_mtime_ns, "size": st.st_size, "rows": rows}))
+            except OSError:
+                pass
+
     def clear(self) -> None:
         """彻底清理，包括物理标记"""
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
-        if os.path.exists(self._done_file):
-            os.remove(self._done_file)
+        self._close_handle()
+        for path in (self.file_path, self._done_file, self._count_file):
+            try: os.remove(path)
+            except FileNotFoundError: pass
         self._cached_size = 0
+        self._wrote = False
+        with self._index_lock:
+            self._reset_index()
 
     def reset_finished(self):
         """核心修复：撕掉旧封条，让流重新激活"""
         if os.path.exists(self._done_file):
             os.remove(self._done_file)
-        self._cached_size = None # 重置缓存，强制重新扫描
\ No newline at end of file
+        self._cached_size = None # 重置缓存，强制重新扫描
+
+class BufferedJsonlStorage(JsonlStorage):
+    """
+    组提交版 JSONL 存储：小批次先编码后攒在内存，满足任一条件时合并成一次写出
+    - 待写字节数超过 max_pending_bytes
+    - 首条待写数据等待超过 flush_interval 秒 (共用的后台冲刷线程)
+    - 读取 / 计数 / 封条 / 显式 flush()
+    """
+
+    def __init__(self, file_path: str, max_pending_bytes: int = 256 * 1024, flush_interval: float = 0.1):
+        super().__init__(file_path)
+        self.max_pending_bytes = max_pending_bytes
+        self.flush_interval = flush_interval
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._buf_lock = threading.Lock()
+        self._flush_scheduled = False # 当前缓冲窗口是否已向后台冲刷线程登记
+
+    def append(self, items: List[Any]) -> None:
+        lines = self._encode_lines(items)
+        if not lines:
+            return
+        with self._buf_lock:
+            self._pending.extend(lines)
+            self._pending_bytes += sum(map(len, lines)) + len(lines)
+            if self._pending_bytes >= self.max_pending_bytes:
+                self._flush_locked()
+            elif not self._flush_scheduled:
+                self._flush_scheduled = True
+                flusher.schedule(self.flush, self.flush_interval)
+
+    def _flush_locked(self) -> None:
+        self._flush_scheduled = False
+        if self._pending:
+            lines, self._pending, self._pending_bytes = self._pending, [], 0
+            self._write_lines(lines)
+
+    def flush(self) -> None:
+        """立即写出全部待写数据"""
+        with self._buf_lock:
+            self._flush_locked()
+
+    # 与 CsvStorage 保持一致，供 Stream.flush() / 检查点前调用
+    flush_batch = flush
+
+    def read(self, offset: int, limit: int) -> List[Any]:
+        self.flush()
+        return super().read(offset, limit)
+
+    def size(self) -> int:
+        self.flush()
+        return super().size()
+
+    def mark_finished(self):
+        self.flush()
+        super().mark_finished()
+
+    def clear(self) -> None:
+        with self._buf_lock:
+            self._flush_scheduled = False
+            self._pending, self._pending_bytes = [], 0
+        super().clear()
+
+    def __del__(self):
+        try: self.flush()
+        except Exception: pass
+        super().__del__()
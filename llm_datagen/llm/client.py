@@ -1,10 +1,21 @@
 """LLM 客户端实现：单次和批量调用"""
+import atexit
 import json
+import queue
+import re
 import threading
 from typing import List, Tuple, Dict, Any, Optional, Callable
-from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
 from llm_datagen.core.llm import ILLMClient, IBatchLLMClient
 from llm_datagen.core.exceptions import LLMError
+from llm_datagen.util.fastjson import loads
+
+
+# parse_json 预编译模式
+_JSON_FENCE_RE = re.compile(r"```json(.*?)(?:```|\Z)", re.S)
+_FENCE_RE = re.compile(r"```(.*?)```", re.S)
+_STRUCT_START_RE = re.compile(r"[\[{]")
+_BRACKET_RE = re.compile(r"[\[\]{}]")
 
 
 class LLMClient(ILLMClient):
@@ -22,6 +33,7 @@ class LLMClient(ILLMClient):
         """
         self.model_name = model_name
         self._container = model_container
+        self._pool_cache = None # 首次解析后缓存模型池引用，热路径免去容器查找
         self._usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
         self._lock = threading.Lock()
     
@@ -35,8 +47,15 @@ class LLMClient(ILLMClient):
     
     @property
     def pool(self):
-        """获取模型池"""
-        return self.container.get(self.model_name)
+        """获取模型池（首次解析后缓存）"""
+        pool = self._pool_cache
+        if pool is None:
+            pool = self._pool_cache = self.container.get(self.model_name)
+        return pool
+
+    def reset_pool(self) -> None:
+        """容器中的同名模型池被替换后调用，下次访问时重新解析"""
+        self._pool_cache = None
     
     def call(self, prompt: str, **kwargs) -> Tuple[str, Dict[str, int]]:
         """
@@ -83,28 +102,29 @@ class LLMClient(ILLMClient):
         """
         if not response:
             return None
+        # 快速路径：已是完整 JSON（如 json_object 模式的返回）时直接解析，跳过提取与修复流程
+        if response[0] in '{[' and response[-1] in '}]':
+            try:
+                return loads(response)
+            except (json.JSONDecodeError, TypeError):
+                pass
         try:
             cleaned = response.strip()
-            # 1. 尝试从 Markdown 代码块中提取
-            if "```json" in cleaned:
-                cleaned = cleaned.split("```json")[1].split("```")[0].strip()
-            elif "```" in cleaned:
-                parts = cleaned.split("```")
-                if len(parts) >= 3:
-                    cleaned = parts[1].strip()
+            # 1. 尝试从 Markdown 代码块中提取 (```json 块允许缺少收尾围栏，兼容截断输出)
+            if "```" in cleaned:
+                m = _JSON_FENCE_RE.search(cleaned) or _FENCE_RE.search(cleaned)
+                if m:
+                    cleaned = m.group(1).strip()
             
             # 2. 尝试寻找 JSON 结构的起点（处理带分析文字的返回）
-            if not (cleaned.startswith("{") or cleaned.startswith("[")):
-                start_dict = cleaned.find("{")
-                start_list = cleaned.find("[")
-                if start_dict != -1 and (start_list == -1 or start_dict < start_list):
-                    cleaned = cleaned[start_dict:]
-                elif start_list != -1:
-                    cleaned = cleaned[start_list:]
+            if not cleaned.startswith(("{", "[")):
+                m = _STRUCT_START_RE.search(cleaned)
+                if m:
+                    cleaned = cleaned[m.start():]
             
             # 3. 尝试标准解析
             try:
-                return json.loads(cleaned)
+                return loads(cleaned)
             except json.JSONDecodeError:
                 # 4. 容错处理：处理截断 (通用闭合法)
                 if (cleaned.startswith("{") and not cleaned.endswith("}")) or \
@@ -114,29 +134,28 @@ class LLMClient(ILLMClient):
                     if temp.count('"') % 2 != 0:
                         temp += '"'
                     
-                    # 使用栈补齐未闭合的括号
+                    # 使用栈补齐未闭合的括号：正则只挑出括号字符，栈只遍历括号而非全文
                     stack = []
-                    for char in temp:
+                    for char in _BRACKET_RE.findall(temp):
                         if char == '{':
                             stack.append('}')
                         elif char == '[':
                             stack.append(']')
-                        elif char == '}' or char == ']':
-                            if stack and stack[-1] == char:
-                                stack.pop()
+                        elif stack and stack[-1] == char:
+                            stack.pop()
                     
-                    while stack:
-                        temp += stack.pop()
+                    if stack:
+                        temp += ''.join(reversed(stack))
                     
                     try:
-                        return json.loads(temp)
+                        return loads(temp)
                     except:
                         # 特殊兜底：如果是之前 sessions 结构的严重截断
                         if '"sessions": [' in cleaned:
                             last_brace = cleaned.rfind("}")
                             if last_brace != -1:
                                 try:
-                                    return json.loads(cleaned[:last_brace+1] + "\n  ]\n}")
+                                    return loads(cleaned[:last_brace+1] + "\n  ]\n}")
                                 except:
                                     pass
                 raise
@@ -149,6 +168,41 @@ class BatchLLMClient(LLMClient, IBatchLLMClient):
     批量并发 LLM 客户端：通过多线程实现并发，并保证输出顺序
     """
     
+    def __init__(self, model_name: str, model_container=None):
+        super().__init__(model_name, model_container)
+        # 复用线程池，避免每批都创建/销毁线程：每次 call_batch 独占借出一个池、结束后归还，
+        # 同一实例被多个线程并发调用时（如 ParallelBatchNode 的 parallel_size > 1）各自拿到独立的池，
+        # 总并发仍为 调用方数 × max_workers，不会被单个池的大小截断
+        self._idle_executors: Dict[int, List[ThreadPoolExecutor]] = {}
+        self._executors: List[ThreadPoolExecutor] = []
+        self._executors_lock = threading.Lock()
+
+    def _acquire_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """借出一个 max_workers 大小的空闲线程池，没有空闲的则新建"""
+        with self._executors_lock:
+            idle = self._idle_executors.get(max_workers)
+            if idle:
+                return idle.pop()
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-batch")
+            self._executors.append(executor)
+        # 进程退出时不等待在途请求，防止阻塞退出
+        atexit.register(executor.shutdown, wait=False)
+        return executor
+
+    def _release_executor(self, max_workers: int, executor: ThreadPoolExecutor) -> None:
+        with self._executors_lock:
+            # 期间已被 shutdown() 回收的池不再放回
+            if executor in self._executors:
+                self._idle_executors.setdefault(max_workers, []).append(executor)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """关闭复用的线程池（之后再次调用 call_batch 会按需重建）"""
+        with self._executors_lock:
+            executors, self._executors, self._idle_executors = self._executors, [], {}
+        for executor in executors:
+            atexit.unregister(executor.shutdown)
+            executor.shutdown(wait=wait)
+
     def call_batch(
         self, 
         prompts: List[str], 
@@ -172,48 +226,55 @@ class BatchLLMClient(LLMClient, IBatchLLMClient):
             return []
         
         results = [None] * len(prompts)
-        executor = ThreadPoolExecutor(max_workers=max_workers)
+        executor = self._acquire_executor(max_workers)
+        # 用量先在本地累加，批次结束时一次性并入，避免每完成一个请求就抢一次锁
+        prompt_tokens = completion_tokens = total_tokens = 0
         
         try:
-            # 1. 提交所有任务
-            future_to_idx = {
-                executor.submit(self.pool.call, p, **kwargs): i
-                for i, p in enumerate(prompts)
-            }
+            # 1. 提交所有任务，完成时由回调把 future 推入完成队列
+            done_queue = queue.SimpleQueue()
+            future_to_idx = {}
+            pool_call = self.pool.call
+            submit = executor.submit
+            for i, p in enumerate(prompts):
+                f = submit(pool_call, p, **kwargs)
+                future_to_idx[f] = i
+                f.add_done_callback(done_queue.put)
             
-            # 2. 收集结果（保证顺序）
-            pending_futures = set(future_to_idx.keys())
-            
-            while pending_futures:
+            # 2. 收集结果（按下标回填，保证顺序）：每完成一个 O(1)，不再反复扫描整个待完成集合
+            remaining = len(future_to_idx)
+            while remaining:
                 # 检查是否取消
                 if is_cancelled_func and is_cancelled_func():
                     # 尝试取消未开始的任务
-                    for f in pending_futures:
+                    for f in future_to_idx:
                         f.cancel()
                     break
 
-                # 等待已完成的任务
-                done, not_done = wait(pending_futures, timeout=0.5, return_when=FIRST_COMPLETED)
-                
-                for f in done:
-                    idx = future_to_idx[f]
-                    try:
-                        res, usage = f.result()
-                        results[idx] = (res, usage)
-                        with self._lock:
-                            self._usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
-                            self._usage["completion_tokens"] += usage.get("completion_tokens", 0)
-                            self._usage["total_tokens"] += usage.get("total_tokens", 0)
-                    except Exception as e:
-                        results[idx] = ("", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
-                    pending_futures.remove(f)
+                # 空闲时最多阻塞 0.5s，以便及时响应取消
+                try:
+                    f = done_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                remaining -= 1
+                idx = future_to_idx[f]
+                try:
+                    res, usage = f.result()
+                    dp, dc, dt = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), usage.get("total_tokens", 0)
+                    results[idx] = (res, usage)
+                    prompt_tokens += dp; completion_tokens += dc; total_tokens += dt
+                except Exception as e:
+                    results[idx] = ("", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
         except Exception as e:
             if "interpreter shutdown" not in str(e):
                 raise LLMError(f"Batch LLM execution failed: {e}") from e
         finally:
-            # 非阻塞关闭，防止阻塞进程退出
-            # 如果已取消，则强制不等待
-            wait_on_shutdown = not (is_cancelled_func and is_cancelled_func())
-            executor.shutdown(wait=wait_on_shutdown)
+            self._release_executor(max_workers, executor)
+            # 取消或异常时同样并入已完成部分的用量
+            if total_tokens or prompt_tokens or completion_tokens:
+                with self._lock:
+                    self._usage["prompt_tokens"] += prompt_tokens
+                    self._usage["completion_tokens"] += completion_tokens
+                    self._usage["total_tokens"] += total_tokens
         
         return results
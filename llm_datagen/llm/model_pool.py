@@ -1,8 +1,12 @@
 """模型池实现：支持多模型注册、负载均衡和故障转移"""
+import atexit
+import itertools
 import os
+import queue
 import threading
 import time
 import logging
+import logging.handlers
 from typing import List, Optional, Dict, Any, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
 try:
@@ -23,11 +27,16 @@ if not _logger.handlers:
         log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs")
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, f"model_pool_{datetime.datetime.now().strftime('%Y%m%d')}.log")
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)
         file_handler.setLevel(logging.INFO)
         formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
         file_handler.setFormatter(formatter)
-        _logger.addHandler(file_handler)
+        # 请求线程只做入队，由单个后台线程写文件，热路径不再阻塞在磁盘 IO 上
+        _log_queue = queue.SimpleQueue()
+        _log_listener = logging.handlers.QueueListener(_log_queue, file_handler)
+        _log_listener.start()
+        atexit.register(_log_listener.stop) # 退出时排空队列并关闭文件
+        _logger.addHandler(logging.handlers.QueueHandler(_log_queue))
     except Exception:
         pass
 
@@ -53,14 +62,12 @@ class BaseModelPool(ILLMClient):
         self.model_type = model_type
         self.default_params = default_params or {}
         self.timeout = timeout or self.DEFAULT_TIMEOUT
-        self.lock = threading.Lock()
-        self.index = 0
+        # 轮询计数器：next() 在 GIL 下原子，取配置无需加锁
+        self._rr_counter = itertools.count()
     
     def _get_next_config(self) -> ModelConfig:
-        with self.lock:
-            cfg = self.configs[self.index]
-            self.index = (self.index + 1) % len(self.configs)
-            return cfg
+        configs = self.configs
+        return configs[next(self._rr_counter) % len(configs)]
     
     def call(self, prompt: str, retry: int = 2, timeout: Optional[float] = None, **kwargs) -> Tuple[str, Dict[str, int]]:
         raise NotImplementedError
@@ -78,10 +85,10 @@ class BaseModelPool(ILLMClient):
                     idx = future_to_idx[future]
                     try: results[idx] = future.result()
                     except Exception as e:
-                        _logger.error(f"Batch pool request failed at index {idx}: {e}")
+                        _logger.error("Batch pool request failed at index %d: %s", idx, e)
                         results[idx] = ("", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
             except FutureTimeoutError:
-                _logger.error(f"Batch pool overall timeout (timeout={overall_timeout}s)")
+                _logger.error("Batch pool overall timeout (timeout=%ss)", overall_timeout)
                 for idx in range(len(prompts)):
                     if results[idx] is None:
                         results[idx] = ("", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
@@ -101,10 +108,14 @@ class OpenAIPool(BaseModelPool):
         if OpenAI is None:
             raise LLMError("未找到 openai 库。请运行 'pip install openai' 来支持 OpenAI 协议模型（包括 Doubao/Qwen 等）。")
         cache_key = f"{cfg.base_url}_{cfg.api_key}"
-        with self._client_lock:
-            if cache_key not in self._clients:
-                self._clients[cache_key] = OpenAI(api_key=cfg.api_key, base_url=cfg.base_url, timeout=cfg.timeout or self.timeout)
-            return self._clients[cache_key]
+        # 命中缓存直接返回 (dict 读在 GIL 下原子)，仅首次创建时加锁，避免并发重复构造
+        client = self._clients.get(cache_key)
+        if client is None:
+            with self._client_lock:
+                client = self._clients.get(cache_key)
+                if client is None:
+                    client = self._clients.setdefault(cache_key, OpenAI(api_key=cfg.api_key, base_url=cfg.base_url, timeout=cfg.timeout or self.timeout))
+        return client
     
     def call(self, prompt: str, retry: int = 2, timeout: Optional[float] = None, **kwargs) -> Tuple[str, Dict[str, int]]:
         last_err = None
@@ -120,12 +131,12 @@ class OpenAIPool(BaseModelPool):
                 usage = getattr(response, 'usage', None)
                 usage_dict = {"prompt_tokens": usage.prompt_tokens if usage else 0, "completion_tokens": usage.completion_tokens if usage else 0, "total_tokens": usage.total_tokens if usage else 0}
                 elapsed = time.time() - start_time
-                _logger.info(f"✅ [{self.model_type}] 成功 | 耗时: {elapsed:.2f}s | Tokens: Prompt={usage_dict['prompt_tokens']}, Completion={usage_dict['completion_tokens']}, Total={usage_dict['total_tokens']}")
+                _logger.info("✅ [%s] 成功 | 耗时: %.2fs | Tokens: Prompt=%s, Completion=%s, Total=%s", self.model_type, elapsed, usage_dict['prompt_tokens'], usage_dict['completion_tokens'], usage_dict['total_tokens'])
                 return content, usage_dict
             except Exception as e:
                 elapsed = time.time() - start_time
                 last_err = e
-                _logger.warning(f"⚠️ [{self.model_type}] 失败/超时 (尝试 {attempt+1}/{retry+1}): {e}")
+                _logger.warning("⚠️ [%s] 失败/超时 (尝试 %d/%d): %s", self.model_type, attempt + 1, retry + 1, e)
                 if attempt < retry: time.sleep(0.5 * (attempt + 1))
         raise LLMError(f"[{self.model_type}] 调用全部失败: {last_err}")
 
@@ -143,10 +154,14 @@ class AzurePool(BaseModelPool):
         if AzureOpenAI is None:
             raise LLMError("未找到 openai 库。请运行 'pip install openai' 来支持 Azure OpenAI。")
         cache_key = f"{cfg.base_url}_{cfg.api_key}"
-        with self._client_lock:
-            if cache_key not in self._clients:
-                self._clients[cache_key] = AzureOpenAI(api_key=cfg.api_key, api_version="2025-01-01-preview", azure_endpoint=cfg.base_url, timeout=cfg.timeout or self.timeout)
-            return self._clients[cache_key]
+        # 命中缓存直接返回，仅首次创建时加锁
+        client = self._clients.get(cache_key)
+        if client is None:
+            with self._client_lock:
+                client = self._clients.get(cache_key)
+                if client is None:
+                    client = self._clients.setdefault(cache_key, AzureOpenAI(api_key=cfg.api_key, api_version="2025-01-01-preview", azure_endpoint=cfg.base_url, timeout=cfg.timeout or self.timeout))
+        return client
     
     def call(self, prompt: str, retry: int = 2, timeout: Optional[float] = None, **kwargs) -> Tuple[str, Dict[str, int]]:
         last_err = None
@@ -162,12 +177,12 @@ class AzurePool(BaseModelPool):
                 usage = getattr(response, 'usage', None)
                 usage_dict = {"prompt_tokens": usage.prompt_tokens if usage else 0, "completion_tokens": usage.completion_tokens if usage else 0, "total_tokens": usage.total_tokens if usage else 0}
                 elapsed = time.time() - start_time
-                _logger.info(f"✅ [Azure] 成功 | 模型: {cfg.model} | 耗时: {elapsed:.2f}s | Tokens: Prompt={usage_dict['prompt_tokens']}, Completion={usage_dict['completion_tokens']}, Total={usage_dict['total_tokens']}")
+                _logger.info("✅ [Azure] 成功 | 模型: %s | 耗时: %.2fs | Tokens: Prompt=%s, Completion=%s, Total=%s", cfg.model, elapsed, usage_dict['prompt_tokens'], usage_dict['completion_tokens'], usage_dict['total_tokens'])
                 return content, usage_dict
             except Exception as e:
                 elapsed = time.time() - start_time
                 last_err = e
-                _logger.warning(f"⚠️ [Azure] 失败/超时 (尝试 {attempt+1}/{retry+1}): {e}")
+                _logger.warning("⚠️ [Azure] 失败/超时 (尝试 %d/%d): %s", attempt + 1, retry + 1, e)
                 if attempt < retry: time.sleep(1 * (attempt + 1))
         raise LLMError(f"[Azure] 调用全部失败: {last_err}")
 
@@ -0,0 +1,236 @@
+"""
+GenericLLMOperator 的逐条热路径：prompt 渲染与结果组装。
+
+本模块是纯 Python 实现；安装时设置 LLM_DATAGEN_CYTHON=1 可用 Cython (纯 Python 模式) 将其编译为扩展
+(需预先安装 Cython 并使用 `pip install --no-build-isolation .`)，
+编译产物与本文件同名，导入时自动优先，两者行为一致。
+"""
+import functools
+import logging
+import re
+import string
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import minijinja
+except ImportError:  # pragma: no cover - 可选模板引擎
+    minijinja = None
+
+logger = logging.getLogger("DataGen.Operators")
+
+# template_engine="auto" 时，字段数超过该阈值才切换到 minijinja（字段少时 str.format 已足够快）
+JINJA_MIN_FIELDS = 5
+# 不能直接作为 Jinja 变量名的字段（字面量 / 运算符关键字）
+_JINJA_RESERVED = frozenset(("true", "false", "none", "True", "False", "None", "and", "or", "not", "in", "is", "if", "else"))
+
+_FIELD_ROOT_RE = re.compile(r"[^.\[]*")
+
+
+@functools.lru_cache(maxsize=128)
+def template_fields(tmpl: str) -> Tuple[str, ...]:
+    """解析一次模板，返回其引用的顶层字段名（去重保序；a.b / a[0] 取 a）"""
+    roots = (_FIELD_ROOT_RE.match(field).group(0) for _, field, _, _ in string.Formatter().parse(tmpl) if field is not None)
+    return tuple(dict.fromkeys(roots))
+
+
+def _to_jinja(tmpl: str) -> Optional[str]:
+    """把仅含简单 {name} 占位符的 format 模板翻译为 Jinja 语法；含格式说明、转换或复合字段时返回 None"""
+    parts: List[str] = []
+    for literal, field, spec, conv in string.Formatter().parse(tmpl):
+        if literal:
+            if "{" in literal:
+                if "endraw" in literal:
+                    return None
+                literal = "{% raw %}" + literal + "{% endraw %}"
+            parts.append(literal)
+        if field is None:
+            continue
+        if spec or conv or not field.isidentifier() or field in _JINJA_RESERVED:
+            return None
+        parts.append("{{ " + field + " }}")
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_jinja(tmpl: str) -> Optional[Callable[[Dict[str, Any]], str]]:
+    """
+    用 minijinja 预编译模板，返回 item -> prompt 的渲染函数；未安装 minijinja 或模板无法翻译时返回 None
+    渲染失败（键非字符串等）时该条回退 str.format_map，保证与默认引擎同样的报错与兜底路径
+    """
+    if minijinja is None:
+        return None
+    try:
+        source = _to_jinja(tmpl)
+    except ValueError:
+        return None
+    if source is None:
+        return None
+    env = minijinja.Environment()
+    # 缺字段时报错而不是渲染为空串；保留末尾换行，与 str.format 输出一致
+    env.undefined_behavior = "strict"
+    env.keep_trailing_newline = True
+    env.add_template("prompt", source)
+    render_template = env.render_template
+    format_map = tmpl.format_map
+
+    def render(item: Dict[str, Any]) -> str:
+        try:
+            return render_template("prompt", **item)
+        except Exception:
+            return format_map(item)
+    return render
+
+
+class RenderMap(dict):
+    """渲染用字典：缺字段时依次尝试 text→content 别名、data 嵌套解包，均无才抛 KeyError"""
+    __slots__ = ()
+
+    def __missing__(self, key):
+        # 自动兼容：如果模板要 {text} 但只有 {content}，自动映射
+        if key == "text" and "content" in self:
+            return self["content"]
+        data = self.get("data")
+        if isinstance(data, dict) and key in data:
+            return data[key]
+        raise KeyError(key)
+
+
+def auto_max_workers(prompts: Sequence[str], max_batch_tokens: int, max_in_flight: int) -> int:
+    """
+    按服务端单批 token 容量推算并发数：max_batch_tokens / 平均 prompt token（按 4 字符 ≈ 1 token 估算），上限 max_in_flight
+    结果向下取整到 2 的幂，避免批次间平均长度的细小波动导致客户端按并发数缓存的线程池不断新建
+    """
+    avg_tokens = sum(map(len, prompts)) // 4 // len(prompts)
+    workers = min(max_in_flight, max(1, max_batch_tokens // max(1, avg_tokens)))
+    return 1 << (workers.bit_length() - 1)
+
+
+def split_by_token_budget(prompts: Sequence[str], max_batch_tokens: int) -> List[Tuple[int, int]]:
+    """
+    按 token 预算把 prompt 切成连续子批，每个子批估算 token 之和不超过 max_batch_tokens
+    （单条即超预算的 prompt 独占一批）
+    Returns:
+        [(start, end), ...] 切片区间
+    """
+    bounds: List[Tuple[int, int]] = []
+    start = budget = 0
+    for i, p in enumerate(prompts):
+        tokens = len(p) // 4
+        if i > start and budget + tokens > max_batch_tokens:
+            bounds.append((start, i))
+            start, budget = i, 0
+        budget += tokens
+    bounds.append((start, len(prompts)))
+    return bounds
+
+
+def lift_prompts(items: Sequence[Any], prompt_field: str) -> Tuple[List[int], List[str]]:
+    """直接取 item[prompt_field] 作为 prompt（非字典、缺字段或非字符串 / 空串的条目跳过）"""
+    actual_indices: List[int] = []
+    actual_prompts: List[str] = []
+    add_index, add_prompt = actual_indices.append, actual_prompts.append
+    for i, item in enumerate(items):
+        p = item.get(prompt_field) if isinstance(item, dict) else None
+        if p and isinstance(p, str):
+            add_index(i)
+            add_prompt(p)
+    return actual_indices, actual_prompts
+
+
+def render_prompts(
+    items: Sequence[Any],
+    prompt_tmpl: str,
+    fields: Tuple[str, ...],
+    on_missing: Callable[[str, Any, KeyError], Optional[str]],
+    render_full: Optional[Callable[[Dict[str, Any]], str]] = None,
+) -> Tuple[List[int], List[str]]:
+    """
+    单趟渲染整批 prompt，只收集渲染成功的项
+    render_full: 字段在顶层齐全时使用的渲染函数（如 compile_jinja 的结果），默认 prompt_tmpl.format_map
+    Returns:
+        (下标列表, prompt 列表)，两者一一对应
+    """
+    # 模板不含任何占位符时，渲染结果与条目无关：只渲染一次（处理 {{ }} 转义）并复用到每一条
+    if not fields:
+        return list(range(len(items))), [prompt_tmpl.format()] * len(items)
+    actual_indices: List[int] = []
+    actual_prompts: List[str] = []
+    # 两个结果列表只做尾部追加（摊还 O(1)），预先绑定 append 省去每条的属性查找
+    add_index, add_prompt = actual_indices.append, actual_prompts.append
+    # 按批次首个字典条目探测数据形态：字段不在顶层而 data 为嵌套字典时，整批优先直接用 data 渲染
+    sample = next((x for x in items if isinstance(x, dict)), None)
+    nested = sample is not None and isinstance(sample.get("data"), dict) and not all(f in sample for f in fields)
+    # 顶层同名字段（及 text→content 别名）优先于 data，条目出现这些键时仍走 RenderMap 以保持取值顺序
+    shadow = fields + ("content",) if "text" in fields else fields
+    if render_full is None:
+        render_full = prompt_tmpl.format_map
+    for i, item in enumerate(items):
+        try:
+            # 现在的 item 已经是框架剥离后的纯业务字典
+            if isinstance(item, dict):
+                # 字段齐全时直接在原字典上渲染；嵌套批次直接取 data；其余由 RenderMap.__missing__ 内联处理别名与 data 解包
+                if all(f in item for f in fields):
+                    p = render_full(item)
+                else:
+                    data = item.get("data") if nested else None
+                    if isinstance(data, dict) and all(f in data for f in fields) and not any(f in item for f in shadow):
+                        mapping = data
+                    else:
+                        mapping = RenderMap(item)
+                    # 核心：使用 format_map 直接按字段取值渲染，省去 **kwargs 解包拷贝
+                    p = prompt_tmpl.format_map(mapping)
+            else:
+                # 非字典回退
+                p = prompt_tmpl.format(text=str(item), content=str(item))
+        except KeyError as e:
+            # 兜底：别名与 data 中均无此字段
+            p = on_missing(prompt_tmpl, item, e)
+        except Exception as e:
+            logger.warning("Prompt 渲染异常 [Item:%s]: %s", i, e)
+            continue
+        if p is not None:
+            add_index(i)
+            add_prompt(p)
+    return actual_indices, actual_prompts
+
+
+def assemble_results(
+    items: Sequence[Any],
+    actual_indices: Sequence[int],
+    responses: Sequence[Tuple[str, Dict[str, int]]],
+    parse_json: Optional[Callable[[str], Any]],
+    report_usage: Optional[Callable[[Dict[str, Any]], None]],
+    provider: Optional[str],
+    model_name: str,
+) -> List[Any]:
+    """把 LLM 响应按下标回填为结果列表，未渲染 / 未返回的位置为 None；parse_json 为 None 时只保留原始输出"""
+    results: List[Any] = [None] * len(items)
+    # 用量上报的固定部分只构建一次，逐条只合并 usage
+    base_usage = {"provider": provider, "model": model_name}
+    for idx, (resp, usage) in zip(actual_indices, responses):
+        original_item = items[idx]
+        base = original_item if isinstance(original_item, dict) else {"content": original_item}
+
+        # 尝试解析 JSON 增强结果：只有对象才会被合并，不含 '{' 的纯文本回复直接跳过解析
+        parsed = None
+        if parse_json is not None and isinstance(resp, str) and "{" in resp:
+            try:
+                parsed = parse_json(resp)
+            except Exception:
+                pass
+
+        # 创建结果副本，保持平铺：一次字典字面量合并完成复制、写入 llm_output 与合并业务字段
+        if isinstance(parsed, dict):
+            # 直接合并业务字段，不加任何前缀（框架保留字段除外）
+            if "_i" in parsed or "_meta" in parsed:
+                parsed = {k: v for k, v in parsed.items() if k not in ("_i", "_meta")}
+            res_item = {**base, "llm_output": resp, **parsed}
+        else:
+            res_item = {**base, "llm_output": resp}
+
+        # 上报 Token (提供商, 模型名, 用量指标)
+        if report_usage:
+            # 修复：report_usage 仅接受一个 dict 参数
+            report_usage({**base_usage, **usage})
+        results[idx] = res_item
+    return results
@@ -1,10 +1,14 @@
 """LLM 算子实现"""
 import json
 import logging
-from typing import List, Any, Dict, Optional
+from typing import List, Any, Dict, Optional, Tuple
 from llm_datagen.core.operators import IOperator, BaseOperator
 from llm_datagen.core.node import INodeContext
 from llm_datagen.llm.client import BatchLLMClient
+from llm_datagen.operators._llm_ops import (
+    JINJA_MIN_FIELDS, template_fields, compile_jinja, auto_max_workers, split_by_token_budget,
+    lift_prompts, render_prompts, assemble_results,
+)
 
 logger = logging.getLogger("DataGen.Operators")
 
@@ -30,92 +34,81 @@ class GenericLLMOperator(BaseOperator):
         """审计类型"""
         return "llm"
     
-    def process_batch(self, items: List[Any], ctx: INodeContext = None) -> List[Any]:
-        prompt_tmpl = self.config.get("custom_prompt")
-        if not prompt_tmpl:
-            return items
-        
-        prompts = []
-        valid_indices = []
-        
-        for i, item in enumerate(items):
+    def _render_fallback(self, prompt_tmpl: str, item: Any, error: KeyError) -> Optional[str]:
+        """缺字段时的回退渲染：提示缺失字段，并尝试按 data 嵌套结构解包"""
+        # 显式提示缺少哪个字段（告警被过滤时不物化字段列表、不格式化消息）
+        if logger.isEnabledFor(logging.WARNING):
+            available_keys = list(item.keys()) if isinstance(item, dict) else '非字典'
+            logger.warning("算子格式化失败: 缺少字段 %s。当前可用字段: %s", error, available_keys)
+        # 容错：如果是因为 data 嵌套导致的（理论上框架已处理，但为了双重保险），尝试解包
+        if isinstance(item, dict) and isinstance(item.get("data"), dict):
             try:
-                # 现在的 item 已经是框架剥离后的纯业务字典
-                if isinstance(item, dict):
-                    # 自动兼容：如果模板要 {text} 但只有 {content}，自动映射
-                    render_data = item.copy()
-                    if "text" not in render_data and "content" in render_data:
-                        render_data["text"] = render_data["content"]
-                    
-                    # 核心：使用 format(**render_data) 渲染所有业务字段
-                    p = prompt_tmpl.format(**render_data)
-                else:
-                    # 非字典回退
-                    p = prompt_tmpl.format(text=str(item), content=str(item))
-                
-                prompts.append(p)
-                valid_indices.append(i)
-            except KeyError as e:
-                # 显式提示缺少哪个字段
-                available_keys = list(item.keys()) if isinstance(item, dict) else '非字典'
-                logger.warning(f"算子格式化失败: 缺少字段 {e}。当前可用字段: {available_keys}")
-                # 容错：如果是因为 data 嵌套导致的（理论上框架已处理，但为了双重保险），尝试解包
-                if isinstance(item, dict) and "data" in item and isinstance(item["data"], dict):
-                    try:
-                        p = prompt_tmpl.format(**item["data"])
-                        prompts.append(p)
-                        valid_indices.append(i)
-                        continue
-                    except: pass
-                prompts.append(None)
-            except Exception as e:
-                logger.warning(f"Prompt 渲染异常 [Item:{i}]: {e}")
-                prompts.append(None)
+                return prompt_tmpl.format_map(item["data"])
+            except Exception:
+                pass
+        return None
+
+    def _render(self, items: List[Any], prompt_tmpl: str) -> Tuple[List[int], List[str]]:
+        """按 custom_prompt 渲染整批，返回渲染成功的 (下标列表, prompt 列表)"""
+        # 模板只解析一次（按模板字符串缓存）；模板本身非法时一律走 RenderMap，交由逐条渲染报错
+        try:
+            fields = template_fields(prompt_tmpl)
+        except ValueError:
+            fields = ("",)
         
-        # 过滤掉渲染失败的项
-        actual_prompts = [p for p in prompts if p is not None]
-        actual_indices = [i for i, p in enumerate(prompts) if p is not None]
+        # 可选模板引擎：template_engine="minijinja" 显式启用，"auto" 在字段较多时启用；未安装或模板无法翻译时仍走 str.format
+        engine = self.config.get("template_engine")
+        render_full = None
+        if engine == "minijinja" or (engine == "auto" and len(fields) > JINJA_MIN_FIELDS):
+            render_full = compile_jinja(prompt_tmpl)
+        
+        # 单趟构建：只收集渲染成功的 (下标, prompt)
+        return render_prompts(items, prompt_tmpl, fields, self._render_fallback, render_full)
+
+    def process_batch(self, items: List[Any], ctx: INodeContext = None) -> List[Any]:
+        prompt_field = self.config.get("prompt_field")
+        if prompt_field:
+            # 上游算子已生成最终 prompt：直接取该字段，跳过模板解析与渲染
+            actual_indices, actual_prompts = lift_prompts(items, prompt_field)
+        else:
+            prompt_tmpl = self.config.get("custom_prompt")
+            if not prompt_tmpl:
+                return items
+            actual_indices, actual_prompts = self._render(items, prompt_tmpl)
         
         if not actual_prompts:
             return [None] * len(items)
         
-        # 批量调用 LLM
-        max_workers = self.config.get("max_workers", 10)
-        responses = self.llm.call_batch(
-            actual_prompts, 
-            max_workers=max_workers,
-            is_cancelled_func=ctx.is_cancelled if ctx else None
-        )
+        # 按 prompt 长度排序后提交，长度相近的请求更容易被服务端连续批处理同批调度；
+        # 下标随之同序重排，组装时仍按显式下标回填，输出顺序不变
+        if len(actual_prompts) > 1:
+            order = sorted(range(len(actual_prompts)), key=lambda k: len(actual_prompts[k]))
+            actual_indices = [actual_indices[k] for k in order]
+            actual_prompts = [actual_prompts[k] for k in order]
         
-        # 组装结果
-        results = [None] * len(items)
-        for i, (resp, usage) in enumerate(responses):
-            idx = actual_indices[i]
-            original_item = items[idx]
-            
-            # 创建结果副本，保持平铺
-            res_item = original_item.copy() if isinstance(original_item, dict) else {"content": original_item}
-            res_item["llm_output"] = resp
-            
-            # 尝试解析 JSON 增强结果
-            try:
-                parsed = self.llm.parse_json(resp)
-                if isinstance(parsed, dict):
-                    # 直接合并业务字段，不加任何前缀
-                    res_item.update({k: v for k, v in parsed.items() if k not in ("_i", "_meta")})
-            except Exception:
-                pass
-            
-            # 上报 Token (提供商, 模型名, 用量指标)
-            if ctx: 
-                provider = self.llm.pool.model_type if hasattr(self.llm.pool, "model_type") else "unknown"
-                # 修复：report_usage 仅接受一个 dict 参数
-                usage_metrics = {
-                    "provider": provider,
-                    "model": self.model_name,
-                    **usage
-                }
-                ctx.report_usage(usage_metrics)
-            results[idx] = res_item
+        # 批量调用 LLM：配置了 max_batch_tokens 时按服务端批容量自动推算并发，上限 max_in_flight（默认 max_workers）
+        max_workers = self.config.get("max_workers", 10)
+        max_batch_tokens = self.config.get("max_batch_tokens")
+        is_cancelled = ctx.is_cancelled if ctx else None
+        if not max_batch_tokens:
+            responses = self.llm.call_batch(actual_prompts, max_workers=max_workers, is_cancelled_func=is_cancelled)
+        else:
+            max_workers = auto_max_workers(actual_prompts, max_batch_tokens, self.config.get("max_in_flight", max_workers))
+            # 按 token 预算切成子批逐批提交，避免一次压入整批造成服务端超额与长尾阻塞；取消后不再提交后续子批
+            responses = []
+            for start, end in split_by_token_budget(actual_prompts, max_batch_tokens):
+                if is_cancelled and is_cancelled():
+                    break
+                responses.extend(self.llm.call_batch(actual_prompts[start:end], max_workers=max_workers, is_cancelled_func=is_cancelled))
         
-        return results
+        # 组装结果：循环内不变的属性查找提前解析后传入
+        return assemble_results(
+            items,
+            actual_indices,
+            responses,
+            # parse_json=False 时原样透传 llm_output，整批跳过 JSON 解析
+            parse_json=self.llm.parse_json if self.config.get("parse_json", True) else None,
+            report_usage=ctx.report_usage if ctx else None,
+            provider=getattr(self.llm.pool, "model_type", "unknown") if ctx else None,
+            model_name=self.model_name,
+        )
@@ -1,28 +1,60 @@
 import os
-from typing import Dict, Optional
+import threading
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
 
 class PromptManager:
     """简单的提示词管理类，支持从文件加载提示词模板"""
-    
+
     def __init__(self, search_path: str = None):
         self.search_path = search_path or os.path.dirname(__file__)
+        # 构造时一次性预载目录下全部 .txt 模板，之后的 get_prompt 只是一次只读映射查找
+        self._preloaded: Mapping[str, str] = MappingProxyType(self._preload(self.search_path))
+        # 预载之后新增的模板：命中无锁读取，仅未命中时加锁并二次检查，避免并发重复读盘
         self._cache: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _preload(search_path: str) -> Dict[str, str]:
+        templates = {}
+        try:
+            with os.scandir(search_path) as it:
+                entries = list(it)
+        except OSError:
+            return templates
+        for entry in entries:
+            if entry.name.endswith('.txt') and entry.is_file():
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        templates[entry.name[:-4]] = f.read()
+                except (OSError, UnicodeDecodeError):
+                    continue
+        return templates
+
+    def _load(self, name: str) -> str:
+        """从本实例的目录读取模板；文件不存在时抛出 FileNotFoundError"""
+        with open(os.path.join(self.search_path, f"{name}.txt"), 'r', encoding='utf-8') as f:
+            return f.read()
 
     def get_prompt(self, name: str) -> Optional[str]:
         """
         获取提示词模板。
         :param name: 提示词名称（文件名，不含后缀）
         """
-        if name in self._cache:
-            return self._cache[name]
-            
-        file_path = os.path.join(self.search_path, f"{name}.txt")
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                self._cache[name] = content
-                return content
-        return None
+        content = self._preloaded.get(name)
+        if content is None:
+            content = self._cache.get(name)
+        if content is not None:
+            return content
+        # 预载之后新增的模板按需加载
+        with self._lock:
+            content = self._cache.get(name)
+            if content is None:
+                try:
+                    content = self._cache[name] = self._load(name)
+                except FileNotFoundError:
+                    return None
+            return content
 
 # 全局单例
 prompt_manager = PromptManager()
@@ -0,0 +1,27 @@
+"""原子落盘工具：整段序列化后写入同目录下的独占临时文件，fsync 后再以 os.replace 原子替换目标文件"""
+import os
+import tempfile
+
+
+def atomic_write_text(path: str, text: str, encoding: str = "utf-8") -> None:
+    """
+    将文本原子写入 path。
+    读者要么看到旧的完整文件、要么看到新的完整文件，崩溃时不会留下写了一半的 JSON。
+    每次写入使用 mkstemp 生成的独占临时文件，并发写同一路径时互不踩踏（后替换者胜出）。
+    """
+    dir_path = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dir_path, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp 默认 0600，恢复为普通文件权限，其他进程的读者 (如恢复流程) 仍可读取
+        os.chmod(tmp, 0o644)
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            # 落盘后再替换：断电 / 崩溃后目标文件不会指向内容尚未写入的数据块
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
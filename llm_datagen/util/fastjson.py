@@ -0,0 +1,51 @@
+"""JSON 编解码加速层：安装了 orjson 时走 orjson，否则回退到标准库 json，调用方无需关心"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选加速依赖
+    orjson = None
+
+# orjson.JSONDecodeError 本身就是 json.JSONDecodeError 的子类，调用方统一捕获标准库异常即可
+JSONDecodeError = json.JSONDecodeError
+
+
+def _has_non_finite(obj) -> bool:
+    """递归检查是否含 NaN / ±Infinity 浮点数"""
+    t = type(obj)
+    if t is float:
+        return not math.isfinite(obj)
+    if t is dict:
+        return any(map(_has_non_finite, obj.values()))
+    if t is list or t is tuple:
+        return any(map(_has_non_finite, obj))
+    return False
+
+
+def dumps_bytes(obj) -> bytes:
+    """
+    序列化为 UTF-8 字节 (不转义非 ASCII)。orjson 不支持的类型 (超 64 位整数等) 回退到标准库
+    orjson 会把 NaN / ±Infinity 静默写成 null，而标准库写出 NaN / Infinity：输出含 null 时再检查一次，
+    有非有限浮点数则改用标准库，保证同一条记录无论是否安装 orjson 都序列化为相同内容
+    """
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+        else:
+            # 绝大多数记录不含 null，检查只在出现 null 时才递归
+            if b"null" not in data or not _has_non_finite(obj):
+                return data
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data):
+    """反序列化 str / bytes。orjson 拒绝的输入 (NaN、超 64 位整数等) 交给标准库再判一次"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
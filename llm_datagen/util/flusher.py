@@ -0,0 +1,64 @@
+"""组提交延迟落盘：进程内一个常驻守护线程，按截止时间回调各存储登记的 flush，替代每个缓冲窗口起一个 Timer 线程"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+import weakref
+from typing import Callable, List, Tuple
+
+_logger = logging.getLogger("DataGen.Storage")
+
+
+class DelayedFlusher:
+    """
+    延迟冲刷调度器：schedule(flush, delay) 登记一次 delay 秒后的冲刷
+    - 所有登记共用一个后台线程，线程阻塞在 Condition 上，只在最近的截止时间或有新登记时醒来
+    - 只持有 flush 绑定方法的弱引用，不会延长存储对象的生命周期
+    - 截止前已被提前冲刷的登记到点后照常回调，由 flush 自身在缓冲为空时直接返回
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, weakref.WeakMethod]] = []
+        self._seq = itertools.count() # 截止时间相同时按登记顺序，避免比较弱引用
+        self._thread = None
+
+    def schedule(self, flush: Callable[[], None], delay: float) -> None:
+        entry = (time.monotonic() + delay, next(self._seq), weakref.WeakMethod(flush))
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="GroupCommitFlusher", daemon=True)
+                self._thread.start()
+            elif self._heap[0] is entry:
+                # 新登记成为最早截止：唤醒线程重新计算等待时长
+                self._cond.notify()
+
+    def _run(self) -> None:
+        heap = self._heap
+        with self._cond:
+            while True:
+                if not heap:
+                    self._cond.wait()
+                    continue
+                wait = heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                flush = heapq.heappop(heap)[2]()
+                if flush is None:
+                    continue
+                # 回调在锁外执行：flush 可能阻塞在磁盘 IO 上，期间不妨碍其他线程登记
+                self._cond.release()
+                try:
+                    flush()
+                except Exception:
+                    _logger.exception("组提交后台落盘失败")
+                finally:
+                    flush = None
+                    self._cond.acquire()
+
+
+# 进程级单例：所有组提交存储共用一个冲刷线程
+flusher = DelayedFlusher()
@@ -1,46 +1,18 @@
-"""DataGen 安装配置"""
-from setuptools import setup, find_packages
+"""DataGen 安装配置：元数据与打包配置均在 pyproject.toml，此处仅保留可选的 Cython 构建钩子"""
 import os
+from setuptools import setup
 
-# 读取 README
-readme_path = os.path.join(os.path.dirname(__file__), "README.md")
-long_description = ""
-if os.path.exists(readme_path):
-    with open(readme_path, "r", encoding="utf-8") as f:
-        long_description = f.read()
+# 可选：LLM_DATAGEN_CYTHON=1 时用 Cython 编译 LLM 算子热路径（纯 Python 模式源码，未启用时保持纯 Python 安装）
+ext_modules = []
+if os.environ.get("LLM_DATAGEN_CYTHON") == "1":
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        # 构建隔离环境只安装 [build-system] requires 中的依赖，Cython 需由调用方提供
+        raise SystemExit(
+            "LLM_DATAGEN_CYTHON=1 需要 Cython：请先 `pip install cython`，"
+            "再以 `pip install --no-build-isolation .` 构建（构建隔离环境中不包含 Cython）"
+        )
+    ext_modules = cythonize(["llm_datagen/operators/_llm_ops.py"], language_level=3)
 
-setup(
-    name="llm-datagen",
-    version="1.0.0",
-    description="极简高性能流式数据加工库",
-    long_description=long_description,
-    long_description_content_type="text/markdown",
-    author="llm-datagen Team",
-    author_email="",
-    url="https://github.com/your-org/llm-datagen",
-    packages=find_packages(where=".", include=["llm_datagen*"]),
-    package_dir={"": "."},
-    python_requires=">=3.8",
-    install_requires=[
-        "openai>=1.0.0",
-    ],
-    extras_require={
-        "dev": [
-            "pytest>=7.0.0",
-            "pytest-cov>=4.0.0",
-            "black>=23.0.0",
-            "flake8>=6.0.0",
-        ],
-    },
-    classifiers=[
-        "Development Status :: 3 - Alpha",
-        "Intended Audience :: Developers",
-        "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.8",
-        "Programming Language :: Python :: 3.9",
-        "Programming Language :: Python :: 3.10",
-        "Programming Language :: Python :: 3.11",
-    ],
-    keywords="data processing, pipeline, llm, streaming",
-)
+setup(ext_modules=ext_modules)
@@ -0,0 +1,28 @@
+"""atomic_write_text 并发与清理测试"""
+import json
+import os
+import threading
+
+from llm_datagen.util.atomic import atomic_write_text
+
+
+def test_concurrent_writers_publish_complete_files(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(50):
+                atomic_write_text(path, json.dumps({"writer": n, "i": i, "pad": "x" * 4096}))
+        except Exception as e:  # pragma: no cover - 失败时记录
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["i"] == 49
+    # 不残留临时文件
+    assert os.listdir(tmp_path) == ["checkpoint.json"]
@@ -0,0 +1,59 @@
+"""BatchLLMClient 线程池复用测试"""
+import threading
+import time
+
+from llm_datagen.llm.client import BatchLLMClient
+
+
+class _SlowPool:
+    """记录同时在途请求数的假模型池"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+
+    def call(self, prompt, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return prompt, {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+
+
+def _client():
+    client = BatchLLMClient("fake")
+    client._pool_cache = _SlowPool()
+    return client
+
+
+def test_sequential_batches_reuse_one_pool():
+    client = _client()
+    try:
+        for _ in range(3):
+            assert client.call_batch(["a", "b"], max_workers=2) == [("a", {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}), ("b", {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2})]
+        assert len(client._executors) == 1
+    finally:
+        client.shutdown(wait=True)
+
+
+def test_concurrent_callers_are_not_capped_by_one_pool():
+    client = _client()
+    results = {}
+    barrier = threading.Barrier(3)
+
+    def worker(n):
+        barrier.wait()
+        results[n] = client.call_batch([f"{n}-{i}" for i in range(2)], max_workers=2)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(3)]
+    try:
+        for t in threads: t.start()
+        for t in threads: t.join()
+        # 3 个调用方 × max_workers=2，应能同时在途 6 个请求
+        assert client._pool_cache.peak == 6
+        assert all([r for r, _ in results[n]] == [f"{n}-0", f"{n}-1"] for n in range(3))
+        assert client.pull_usage()["total_tokens"] == 12
+    finally:
+        client.shutdown(wait=True)
@@ -0,0 +1,18 @@
+"""JSON 加速层测试：是否安装 orjson 不应改变序列化结果"""
+import json
+
+from llm_datagen.util.fastjson import dumps_bytes, loads
+
+
+def test_non_finite_floats_match_stdlib():
+    record = {"a": float("nan"), "b": [1.5, float("inf")], "c": {"d": float("-inf")}, "e": None, "f": "文本"}
+    data = dumps_bytes(record)
+    assert data == json.dumps(record, ensure_ascii=False).encode("utf-8")
+    back = loads(data)
+    assert back["a"] != back["a"] and back["b"][1] == float("inf") and back["c"]["d"] == float("-inf")
+    assert back["e"] is None and back["f"] == "文本"
+
+
+def test_plain_records_roundtrip():
+    record = {"i": 1, "x": 0.25, "s": "文本", "n": None, "l": [True, False]}
+    assert loads(dumps_bytes(record)) == record
@@ -0,0 +1,19 @@
+"""检查点后台写盘测试"""
+import pytest
+
+from llm_datagen.core.hooks import _CheckpointWriter
+
+
+def test_checkpoint_writer_surfaces_write_errors(tmp_path):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("not a directory", encoding="utf-8")
+    writer = _CheckpointWriter()
+    # 父路径是普通文件，写盘必然失败
+    writer.submit(str(blocker / "checkpoint.json"), "{}")
+    with pytest.raises(OSError):
+        writer.flush()
+    # 异常只上抛一次，之后的正常写入不受影响
+    good = tmp_path / "ok" / "checkpoint.json"
+    writer.submit(str(good), "{}")
+    writer.flush()
+    assert good.read_text(encoding="utf-8") == "{}"
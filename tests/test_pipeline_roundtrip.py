@@ -0,0 +1,143 @@
+"""管道端到端测试：输入全部行都应到达输出"""
+import csv
+import json
+import threading
+
+import pytest
+
+from llm_datagen import UnifiedOperatorPipeline, BaseOperator, JsonFileCheckpointHooks
+
+
+class Upper(BaseOperator):
+    def process_batch(self, items, ctx=None):
+        return [dict(it, up=it["text"].upper()) for it in items]
+
+
+def _pipeline(tmp_path, rows, trailing_newline, streaming, parallel_size, fmt="jsonl", hooks=None):
+    src = tmp_path / "in.jsonl"
+    src.write_text("\n".join(json.dumps(r) for r in rows) + ("\n" if trailing_newline else ""), encoding="utf-8")
+    out = tmp_path / f"out.{fmt}"
+    pipeline = UnifiedOperatorPipeline(
+        operators=[Upper(), Upper()],
+        input_uri=f"jsonl://{src}",
+        output_uri=f"{fmt}://{out}",
+        batch_size=4,
+        parallel_size=parallel_size,
+        streaming=streaming,
+        base_path=str(tmp_path / "mid"),
+        results_dir=str(tmp_path / "results"),
+        hooks=hooks,
+    )
+    pipeline.create(pipeline_id="roundtrip")
+    return pipeline, out
+
+
+def _run(tmp_path, rows, trailing_newline, streaming, parallel_size, fmt="jsonl", hooks=None):
+    pipeline, out = _pipeline(tmp_path, rows, trailing_newline, streaming, parallel_size, fmt, hooks)
+    try:
+        pipeline.run()
+        assert pipeline.status == "completed"
+    finally:
+        pipeline.shutdown()
+    return out
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("parallel_size", [1, 3])
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_all_rows_reach_output(tmp_path, streaming, parallel_size, trailing_newline):
+    rows = [{"text": f"t{i}", "id": i} for i in range(50)]
+    out = _run(tmp_path, rows, trailing_newline, streaming, parallel_size)
+    result = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert sorted(r["id"] for r in result) == list(range(50))
+    assert all(r["up"] == r["text"].upper() for r in result)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_csv_output_roundtrip(tmp_path, streaming):
+    rows = [{"text": f"t{i}", "id": i} for i in range(50)]
+    out = _run(tmp_path, rows, False, streaming, 3, fmt="csv")
+    with open(out, newline="", encoding="utf-8") as f:
+        result = list(csv.DictReader(f))
+    assert sorted(int(r["id"]) for r in result) == list(range(50))
+
+
+def _pipeline_threads():
+    return {t for t in threading.enumerate() if t.name.startswith(("StreamingNode", "StreamingBatch"))}
+
+
+@pytest.mark.parametrize("parallel_size", [1, 3])
+def test_streaming_pipeline_reuses_threads_until_shutdown(tmp_path, parallel_size):
+    rows = [{"text": f"t{i}", "id": i} for i in range(20)]
+    pipeline, _ = _pipeline(tmp_path, rows, True, True, parallel_size)
+    try:
+        pipeline.run()
+        threads = _pipeline_threads()
+        assert threads
+        # 再次运行与 Master 级恢复都沿用同一批线程，不重新创建
+        pipeline.run()
+        assert _pipeline_threads() == threads
+        pipeline.resume_from_runtime(pipeline.get_runtime())
+        pipeline.run()
+        assert pipeline.status == "completed"
+        assert _pipeline_threads() == threads
+    finally:
+        pipeline.shutdown()
+    assert _pipeline_threads() == set()
+
+
+class Boom(BaseOperator):
+    def process_batch(self, items, ctx=None):
+        if any(it["id"] == 13 for it in items):
+            raise RuntimeError("boom")
+        return items
+
+
+def test_streaming_failure_waits_for_inflight_batches(tmp_path):
+    src = tmp_path / "in.jsonl"
+    src.write_text("".join(json.dumps({"text": "t", "id": i}) + "\n" for i in range(40)), encoding="utf-8")
+    pipeline = UnifiedOperatorPipeline(
+        operators=[Boom()],
+        input_uri=f"jsonl://{src}",
+        output_uri=f"jsonl://{tmp_path / 'out.jsonl'}",
+        batch_size=2,
+        parallel_size=4,
+        streaming=True,
+        base_path=str(tmp_path / "mid"),
+        results_dir=str(tmp_path / "results"),
+    )
+    pipeline.create(pipeline_id="boom")
+    pipeline.run()
+    assert pipeline.status == "failed"
+    pipeline.shutdown()
+    assert _pipeline_threads() == set()
+
+
+class EventRecorder(JsonFileCheckpointHooks):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def on_checkpoint(self, cid, nid, checkpoint):
+        self.events.append(("checkpoint", nid, dict(checkpoint)))
+        super().on_checkpoint(cid, nid, checkpoint)
+
+    def on_node_finish(self, cid, nid):
+        self.events.append(("finish", nid, None))
+        super().on_node_finish(cid, nid)
+
+
+def test_sequential_final_checkpoint_precedes_finish_hook(tmp_path):
+    rows = [{"text": f"t{i}", "id": i} for i in range(30)]
+    recorder = EventRecorder()
+    _run(tmp_path, rows, True, False, 1, hooks=recorder)
+    finished = [i for i, (kind, _, _) in enumerate(recorder.events) if kind == "finish"]
+    assert finished
+    for i in finished:
+        nid = recorder.events[i][1]
+        # 完成钩子负责落盘 checkpoint.json：最终状态的检查点必须在它之前送达
+        before = [cp for kind, n, cp in recorder.events[:i] if kind == "checkpoint" and n == nid]
+        assert before and before[-1]["status"] == "completed"
+        assert before[-1]["current"] == len(rows)
+    checkpoint = json.loads((tmp_path / "results" / "roundtrip" / "checkpoint.json").read_text(encoding="utf-8"))
+    assert all(info["status"] == "completed" for info in checkpoint["nodes"].values())
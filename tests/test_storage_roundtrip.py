@@ -0,0 +1,183 @@
+"""存储层往返测试：写入 / 外部文件读取后 size() 与 read() 必须一致"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from llm_datagen.impl.storage.csv_storage import CsvStorage
+from llm_datagen.impl.storage.jsonl_storage import JsonlStorage, BufferedJsonlStorage
+
+
+def _write_jsonl(path, rows, trailing_newline=True):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(r) for r in rows) + ("\n" if trailing_newline else ""))
+
+
+def _read_paged(storage, page):
+    out, offset = [], 0
+    while True:
+        batch = storage.read(offset, page)
+        if not batch:
+            return out
+        out.extend(batch)
+        offset += len(batch)
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_jsonl_external_file_roundtrip(tmp_path, trailing_newline):
+    rows = [{"i": i} for i in range(50)]
+    path = str(tmp_path / "in.jsonl")
+    _write_jsonl(path, rows, trailing_newline)
+    storage = JsonlStorage(path)
+    assert storage.size() == len(rows)
+    assert storage.read(0, 1000) == rows
+    assert _read_paged(storage, 7) == rows
+    assert storage.read(49, 5) == [{"i": 49}]
+    assert storage.read(50, 5) == []
+
+
+@pytest.mark.parametrize("cls", [JsonlStorage, BufferedJsonlStorage])
+def test_jsonl_append_roundtrip(tmp_path, cls):
+    storage = cls(str(tmp_path / "out.jsonl"))
+    rows = [{"i": i, "text": "中文"} for i in range(23)]
+    for start in range(0, len(rows), 5):
+        storage.append(rows[start:start + 5] + [None, {}])
+    assert storage.size() == len(storage.read(0, 1000)) == len(rows)
+    assert _read_paged(storage, 4) == rows
+    storage.mark_finished()
+    # 重新打开：边车计数与重新扫描的结果一致
+    reopened = JsonlStorage(storage.file_path)
+    assert reopened.size() == len(reopened.read(0, 1000)) == len(rows)
+
+
+def test_jsonl_tail_after_finish_is_visible_to_appender(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    storage = JsonlStorage(path)
+    storage.append([{"i": 0}])
+    with open(path, "ab") as f:
+        f.write(b'{"i": 1}')
+    # 本实例仍持有写句柄且未封条：无换行的尾行可能尚未写完，不应被读出
+    assert storage.read(0, 10) == [{"i": 0}]
+    storage.mark_finished()
+    assert storage.read(0, 10) == [{"i": 0}, {"i": 1}]
+    assert os.path.exists(path + ".done")
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_csv_external_file_roundtrip(tmp_path, trailing_newline):
+    path = tmp_path / "in.csv"
+    path.write_text('a,b\n1,u\n3,"x\ny"' + ("\n" if trailing_newline else ""), encoding="utf-8")
+    storage = CsvStorage(str(path))
+    rows = [{"a": 1, "b": "u"}, {"a": 3, "b": "x\ny"}]
+    assert storage.size() == 2
+    assert storage.read(0, 10) == rows
+    assert _read_paged(storage, 1) == rows
+
+
+def test_csv_unterminated_quote_is_not_a_row(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text('a,b\n1,2\n3,"x', encoding="utf-8")
+    storage = CsvStorage(str(path))
+    assert storage.size() == len(storage.read(0, 10)) == 1
+
+
+def test_csv_append_after_unterminated_last_row(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("a,b\n1,2", encoding="utf-8")
+    storage = CsvStorage(str(path))
+    storage.append([{"a": 3, "b": 4}])
+    storage.mark_finished()
+    reopened = CsvStorage(str(path))
+    assert reopened.read(0, 10) == [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
+    assert reopened.size() == 2
+
+
+def test_csv_append_roundtrip(tmp_path):
+    storage = CsvStorage(str(tmp_path / "out.csv"))
+    rows = [{"i": i, "text": 'q"uote, comma\nline'} for i in range(23)]
+    for start in range(0, len(rows), 5):
+        storage.append(rows[start:start + 5])
+    assert storage.size() == len(storage.read(0, 1000)) == len(rows)
+    assert _read_paged(storage, 4) == rows
+    storage.mark_finished()
+    reopened = CsvStorage(storage.file_path)
+    assert reopened.size() == len(reopened.read(0, 1000)) == len(rows)
+
+
+def test_csv_buffered_rows_reach_disk_without_further_calls(tmp_path):
+    path = tmp_path / "out.csv"
+    storage = CsvStorage(str(path), max_batch_delay=0.05)
+    storage.append([{"i": 1}])
+    # 不再调用任何方法：定时器应在 max_batch_delay 后把已确认的数据落盘，其他读者可见
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and CsvStorage(str(path)).size() != 1:
+        time.sleep(0.01)
+    assert CsvStorage(str(path)).read(0, 10) == [{"i": 1}]
+    storage.append([{"i": 2}])
+    storage.close()
+    assert CsvStorage(str(path)).read(0, 10) == [{"i": 1}, {"i": 2}]
+
+
+def test_csv_group_commit_windows_share_one_flusher_thread(tmp_path):
+    storages = [CsvStorage(str(tmp_path / f"out{k}.csv"), max_batch_delay=0.02) for k in range(3)]
+    before = threading.active_count()
+    for n in range(5):
+        for storage in storages:
+            storage.append([{"i": n}])
+        time.sleep(0.05)
+    # 每个缓冲窗口都由同一个常驻线程冲刷，不再每次新起一个 Timer 线程
+    flushers = [t for t in threading.enumerate() if t.name == "GroupCommitFlusher"]
+    assert len(flushers) == 1
+    assert threading.active_count() <= before + 1
+    for k in range(3):
+        assert CsvStorage(str(tmp_path / f"out{k}.csv")).read(0, 10) == [{"i": n} for n in range(5)]
+
+
+def test_jsonl_count_sidecar_never_outlives_the_file(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text("".join(f'{{"i": {i}}}\n' for i in range(3)))
+    assert JsonlStorage(str(path)).size() == 3
+    # 只读计数不落盘边车
+    assert not os.path.exists(f"{path}.count")
+    path.write_text("".join(f'{{"i": {i}}}\n' for i in range(10)))
+    assert JsonlStorage(str(path)).size() == 10
+
+    storage = JsonlStorage(str(path))
+    storage.append([{"i": 10}])
+    storage.mark_finished()
+    assert JsonlStorage(str(path)).size() == 11
+    # 边车记录之后文件被替换：(mtime_ns, size) 不符，边车作废
+    path.write_text('{"i": 0}\n')
+    assert JsonlStorage(str(path)).size() == 1
+
+def test_buffered_jsonl_windows_share_one_flusher_thread(tmp_path):
+    storages = [BufferedJsonlStorage(str(tmp_path / f"out{k}.jsonl"), flush_interval=0.02) for k in range(3)]
+    for n in range(5):
+        for storage in storages:
+            storage.append([{"i": n}])
+        # 窗口尚未到期：登记在共用线程上，不应为每个窗口起 Timer 线程
+        assert not [t for t in threading.enumerate() if isinstance(t, threading.Timer)]
+        time.sleep(0.05)
+    assert len([t for t in threading.enumerate() if t.name == "GroupCommitFlusher"]) == 1
+    # 不经 flush()：数据应已由后台线程写出，其他读者可见
+    for k in range(3):
+        assert JsonlStorage(str(tmp_path / f"out{k}.jsonl")).read(0, 10) == [{"i": n} for n in range(5)]
+
+def test_csv_types_are_inferred_per_column(tmp_path):
+    path = tmp_path / "typed.csv"
+    path.write_text(
+        "code,zip,n,x,flag,note\n"
+        "007,02134,1,1.5,True,NaN\n"
+        "abc,10001,,2,False,ok\n",
+        encoding="utf-8",
+    )
+    rows = CsvStorage(str(path)).read(0, 10)
+    # 混有文本的列整列保留字符串，前导零不丢；纯数字列整列转换；NA 记号读回 None
+    assert [r["code"] for r in rows] == ["007", "abc"]
+    assert [r["zip"] for r in rows] == [2134, 10001]
+    assert [r["n"] for r in rows] == [1, None]
+    assert [r["x"] for r in rows] == [1.5, 2.0]
+    assert [r["flag"] for r in rows] == [True, False]
+    assert [r["note"] for r in rows] == [None, "ok"]